@@ -0,0 +1,295 @@
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+
+from navit_driver import ADAPTERS, STATUS_ICONS, classify, expected_patches, make_adapter
+from navit_benchmark import latency_stats
+from pixel_budget_sweep import load_array
+
+FRONTEND_FILE = "async_frontend.json"
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+HISTOGRAM_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+_worker_adapter = None
+
+
+def init_worker(name, backend):
+    """Process-pool initializer: each worker loads its own copy of the processor once"""
+    global _worker_adapter
+    _worker_adapter = make_adapter(name, backend)
+    _worker_adapter.load()
+
+
+def worker_grids(images):
+    return _worker_adapter.extract_grids(_worker_adapter.process(images))
+
+
+def histogram(samples_ms, bounds=HISTOGRAM_MS):
+    """Counts per latency bucket: [(label, count)], "≤1ms" ... ">5000ms" """
+    counts = np.bincount(np.searchsorted(bounds, samples_ms), minlength=len(bounds) + 1)
+    labels = [f"≤{b}ms" for b in bounds] + [f">{bounds[-1]}ms"]
+    return list(zip(labels, (int(c) for c in counts)))
+
+
+class MicroBatcher:
+    """asyncio front end over one model: requests queue up and are coalesced into
+    micro-batches, closed when max_batch requests are waiting or max_wait_ms after the
+    first one arrived, whichever comes first. Up to `workers` batches run at once in a
+    thread pool or a process pool. Processors aren't assumed thread-safe (HF fast
+    tokenizers aren't), so either way every worker gets its own processor: thread
+    workers check one out of a pool of `workers` loaded adapters per batch.
+    """
+
+    def __init__(self, adapter, max_batch=8, max_wait_ms=10, workers=1, pool="thread"):
+        self.adapter = adapter
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.workers = workers
+        self.pool = pool
+        self.metrics = {"latency_ms": [], "queue_ms": [], "batch_sizes": [], "queue_depth": [], "batch_ms": []}
+
+    async def __aenter__(self):
+        if self.pool == "process":
+            # spawn, not fork: workers load their own processor instead of inheriting this heap
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                                initializer=init_worker,
+                                                initargs=(self.adapter.name, self.adapter.backend))
+            # Pay the processor loads before the first request is timed
+            await asyncio.gather(*[asyncio.get_running_loop().run_in_executor(self.executor, time.sleep, 0.1)
+                                   for _ in range(self.workers)])
+        else:
+            self.executor = ThreadPoolExecutor(self.workers)
+            if self.adapter.processor is None:
+                self.adapter.load()
+            self.free = [self.adapter]
+            for _ in range(self.workers - 1):
+                copy = make_adapter(self.adapter.name, self.adapter.backend)
+                copy.load()
+                self.free.append(copy)
+        self.queue = asyncio.Queue()
+        self.slots = asyncio.Semaphore(self.workers)
+        self.in_flight = set()
+        self.collector = asyncio.create_task(self.collect())
+        return self
+
+    async def __aexit__(self, *exc):
+        self.collector.cancel()
+        await asyncio.gather(self.collector, return_exceptions=True)
+        await asyncio.gather(*self.in_flight, return_exceptions=True)
+        self.executor.shutdown()
+        for adapter in getattr(self, "free", [])[1:]:
+            adapter.unload()
+
+    async def submit(self, image):
+        """Preprocess one image; resolves to its (t, h, w) grid row"""
+        future = asyncio.get_running_loop().create_future()
+        self.metrics["queue_depth"].append(self.queue.qsize())
+        t0 = time.perf_counter()
+        await self.queue.put((image, future, t0))
+        grid = await future
+        self.metrics["latency_ms"].append((time.perf_counter() - t0) * 1000)
+        return grid
+
+    async def collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Only form a batch once a worker can take it, so requests keep coalescing meanwhile
+            await self.slots.acquire()
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            task = asyncio.create_task(self.run_batch(batch))
+            self.in_flight.add(task)
+            task.add_done_callback(self.in_flight.discard)
+
+    async def run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        self.metrics["batch_sizes"].append(len(batch))
+        self.metrics["queue_ms"].extend((started - t0) * 1000 for _, _, t0 in batch)
+        images = [image for image, _, _ in batch]
+        try:
+            if self.pool == "process":
+                grids = await loop.run_in_executor(self.executor, worker_grids, images)
+            else:
+                # The slots semaphore caps batches in flight at `workers`, so one is always free
+                adapter = self.free.pop()
+                try:
+                    grids = await loop.run_in_executor(
+                        self.executor, lambda: adapter.extract_grids(adapter.process(images)))
+                finally:
+                    self.free.append(adapter)
+            if grids is None or len(grids) != len(batch):
+                raise RuntimeError(f"processor returned {0 if grids is None else len(grids)} grids "
+                                   f"for {len(batch)} images")
+            for (_, future, _), grid in zip(batch, grids):
+                if not future.done():
+                    future.set_result(grid)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self.metrics["batch_ms"].append((time.perf_counter() - started) * 1000)
+            self.slots.release()
+
+    def summary(self, wall_s):
+        m = self.metrics
+        sizes = np.asarray(m["batch_sizes"] or [0])
+        depth = np.asarray(m["queue_depth"] or [0])
+        return {
+            "requests": len(m["latency_ms"]),
+            "throughput_rps": round(len(m["latency_ms"]) / wall_s, 2) if wall_s else 0.0,
+            "latency_ms": latency_stats(m["latency_ms"]) if m["latency_ms"] else {},
+            "queue_ms": latency_stats(m["queue_ms"]) if m["queue_ms"] else {},
+            "histogram": histogram(m["latency_ms"]),
+            "batches": len(m["batch_sizes"]),
+            "batch_size_mean": round(float(sizes.mean()), 2),
+            "batch_size_max": int(sizes.max()),
+            "queue_depth_mean": round(float(depth.mean()), 2),
+            "queue_depth_p95": round(float(np.percentile(depth, 95)), 1),
+            "queue_depth_max": int(depth.max()),
+        }
+
+
+async def drive(batcher, pages, expected, requests, rate=0, concurrency=0, seed=0):
+    """Send `requests` page requests through batcher and check each returned grid.
+
+    Open loop at `rate` requests/s (Poisson arrivals; 0 = all at once), or closed loop
+    with `concurrency` clients each waiting for its reply before sending the next.
+    Returns {status: count}.
+    """
+    rng = random.Random(seed)
+    statuses = {}
+
+    async def one(i):
+        idx = i % len(pages)
+        try:
+            t, h_p, w_p = await batcher.submit(pages[idx])
+            status = classify(h_p * w_p, expected[idx])
+        except Exception:
+            status = "ERROR"
+        statuses[status] = statuses.get(status, 0) + 1
+
+    if concurrency:
+        counter = iter(range(requests))
+
+        async def client():
+            for i in counter:
+                await one(i)
+        await asyncio.gather(*[client() for _ in range(concurrency)])
+        return statuses
+
+    tasks = []
+    for i in range(requests):
+        tasks.append(asyncio.create_task(one(i)))
+        if rate:
+            await asyncio.sleep(rng.expovariate(rate))
+    await asyncio.gather(*tasks)
+    return statuses
+
+
+async def run_frontend(adapter, pages, expected, requests, rate=0, concurrency=0, max_batch=8,
+                       max_wait_ms=10, workers=1, pool="thread", seed=0):
+    async with MicroBatcher(adapter, max_batch, max_wait_ms, workers, pool) as batcher:
+        t0 = time.perf_counter()
+        statuses = await drive(batcher, pages, expected, requests, rate, concurrency, seed)
+        wall_s = time.perf_counter() - t0
+    return {**batcher.summary(wall_s), "statuses": statuses, "wall_s": round(wall_s, 3)}
+
+
+def print_frontend(label, report):
+    lat = report["latency_ms"]
+    print(f"\n{label}: {report['requests']:,} requests in {report['wall_s']:.2f}s "
+          f"→ {report['throughput_rps']:.1f} req/s")
+    if lat:
+        print(f"  latency  p50 {lat['p50']:>8.1f}ms  p95 {lat['p95']:>8.1f}ms  p99 {lat['p99']:>8.1f}ms  "
+              f"(queued p50 {report['queue_ms']['p50']:.1f}ms)")
+    print(f"  batches  {report['batches']:,} (mean {report['batch_size_mean']:.1f}, max {report['batch_size_max']})  "
+          f"queue depth mean {report['queue_depth_mean']:.1f}, p95 {report['queue_depth_p95']:.0f}, "
+          f"max {report['queue_depth_max']}")
+    peak = max((c for _, c in report["histogram"]), default=0)
+    for bucket, count in report["histogram"]:
+        if count:
+            print(f"  {bucket:>8} {'█' * max(1, round(40 * count / peak)):<40} {count:,}")
+    print("  " + "  ".join(f"{STATUS_ICONS.get(s, '?')} {s} {n}" for s, n in sorted(report["statuses"].items())))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="asyncio micro-batching front end: latency under concurrent load")
+    parser.add_argument("model", choices=list(ADAPTERS))
+    parser.add_argument("--backend", help="processor backend (default: the model's hub processor)")
+    parser.add_argument("--offline", action="store_true", help="use the reference-<model> backend")
+    parser.add_argument("--requests", type=int, default=200, help="page requests to send (cycling over the pages)")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="open-loop arrival rate in requests/s, Poisson (0 = all at once)")
+    parser.add_argument("--concurrency", type=int, default=0,
+                        help="closed loop instead: N clients, each waiting for its reply (overrides --rate)")
+    parser.add_argument("--max-batch", type=int, default=8, help="close a micro-batch at this many requests")
+    parser.add_argument("--max-wait-ms", type=float, default=10,
+                        help="close a micro-batch this long after its first request")
+    parser.add_argument("--workers", type=int, default=2,
+                        help="micro-batches processed at once, each worker with its own processor")
+    parser.add_argument("--pool", choices=["thread", "process"], default="thread")
+    parser.add_argument("--compare-serial", action="store_true",
+                        help="also run the same load with batches of 1 on one worker (the harness's loop)")
+    parser.add_argument("--packed", metavar="PATH", help="serve the pages of a packed corpus instead of DOCS")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help=f"report path (default: stress_test_documents/{FRONTEND_FILE})")
+    args = parser.parse_args(argv)
+
+    from test_doc_navit import DOCS, DOC_DIR
+    docs, doc_dir = DOCS, DOC_DIR
+    if args.packed:
+        from packed_corpus import PackedCorpus
+        docs, doc_dir = PackedCorpus(args.packed).docs(), args.packed
+    adapter = make_adapter(args.model, args.backend or (f"reference-{args.model}" if args.offline else None))
+    # Decode every page up front: the load test times preprocessing, not PNG decoding
+    pages = [load_array(doc_dir, d) for d in docs]
+    expected = expected_patches(docs, adapter.profile)
+
+    load = f"{args.concurrency} closed-loop clients" if args.concurrency else \
+        (f"{args.rate:g} req/s" if args.rate else "all at once")
+    print("="*70)
+    print(f"ASYNC FRONT END — {adapter.title} ({adapter.backend}), {args.requests} requests, {load}")
+    print("="*70)
+
+    runs = {}
+    common = dict(requests=args.requests, rate=args.rate, concurrency=args.concurrency, seed=args.seed)
+    runs["batched"] = asyncio.run(run_frontend(adapter, pages, expected, max_batch=args.max_batch,
+                                               max_wait_ms=args.max_wait_ms, workers=args.workers,
+                                               pool=args.pool, **common))
+    print_frontend(f"Micro-batched (≤{args.max_batch} per batch, ≤{args.max_wait_ms:g}ms wait, "
+                   f"{args.workers} {args.pool} workers)", runs["batched"])
+    if args.compare_serial:
+        runs["serial"] = asyncio.run(run_frontend(adapter, pages, expected, max_batch=1, max_wait_ms=0,
+                                                  workers=1, pool="thread", **common))
+        print_frontend("Serial (1 per call, 1 worker)", runs["serial"])
+        b, s = runs["batched"]["latency_ms"], runs["serial"]["latency_ms"]
+        if b and s:
+            print(f"\n  p99 {s['p99']:.1f}ms → {b['p99']:.1f}ms, throughput "
+                  f"{runs['serial']['throughput_rps']:.1f} → {runs['batched']['throughput_rps']:.1f} req/s")
+    adapter.unload()
+
+    out = args.json or os.path.join(DOC_DIR, FRONTEND_FILE)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({"model": args.model, "backend": adapter.backend, "config": vars(args), "runs": runs},
+                  f, indent=2, ensure_ascii=False)
+    print(f"\n Report: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import gc
+import time
+import json
+import hashlib
+import argparse
+import numpy as np
+
+from navit_driver import QwenAdapter, chat_messages, open_page
+from navit_reference import as_tensors
+from processor_backends import image_processor_of
+
+
+def template_hash(processor):
+    """Hash of the processor class and its chat template source"""
+    template = getattr(processor, "chat_template", None) or getattr(processor.tokenizer, "chat_template", None)
+    blob = f"{type(processor).__module__}.{type(processor).__qualname__}\n{template}"
+    return hashlib.blake2b(blob.encode(), digest_size=10).hexdigest()
+
+
+class ChatTemplateCache:
+    """Rendered-and-tokenized chat prompts keyed by (prompt text, template hash).
+
+    The template is rendered once per prompt with a single image placeholder; per call,
+    only the image processor runs and each row's placeholder is spliced out into one
+    pad token per merged patch of its grid, the expansion the processor's text path
+    would have done.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.stats = {"hits": 0, "misses": 0, "render_ms": 0.0}
+        self._hash = {}
+
+    def entry(self, processor, prompt):
+        if id(processor) not in self._hash:
+            self._hash[id(processor)] = template_hash(processor)
+        key = (prompt, self._hash[id(processor)])
+        if key in self.entries:
+            self.stats["hits"] += 1
+            return self.entries[key]
+
+        if processor.tokenizer.pad_token_id is None:
+            raise ValueError(f"{type(processor.tokenizer).__name__} has no pad_token_id to pad spliced rows with: "
+                             "set tokenizer.pad_token or run without the template cache")
+        t0 = time.perf_counter()
+        text = processor.apply_chat_template(chat_messages(prompt), tokenize=False, add_generation_prompt=True)
+        ids = np.asarray(processor.tokenizer.encode(text), dtype=np.int64)
+        pad_id = processor.tokenizer.convert_tokens_to_ids(processor.image_token)
+        pads = np.flatnonzero(ids == pad_id)
+        if pads.size != 1:
+            raise ValueError(f"expected one {processor.image_token} in the rendered template, found {pads.size}")
+        self.entries[key] = {"text": text, "ids": ids, "pad": int(pads[0]), "pad_id": int(pad_id)}
+        self.stats["misses"] += 1
+        self.stats["render_ms"] += (time.perf_counter() - t0) * 1000
+        return self.entries[key]
+
+    def preprocess(self, processor, prompt, images, return_tensors=None):
+        """processor(text=[prompt per image], images=images, padding=True), from the cached template"""
+        entry = self.entry(processor, prompt)
+        ip = image_processor_of(processor)
+        out = dict(ip(images=images, return_tensors="np"))
+        grids = np.asarray(out["image_grid_thw"], dtype=np.int64)
+        out["input_ids"], out["attention_mask"] = splice_rows(
+            entry, np.prod(grids, axis=1) // (ip.merge_size ** 2), processor.tokenizer)
+        return as_tensors(out, return_tensors)
+
+    def summary(self):
+        return (f"Chat template cache: {len(self.entries)} rendered, {self.stats['hits']} hits, "
+                f"{self.stats['render_ms']:.1f}ms spent rendering")
+
+
+def splice_rows(entry, n_tokens, tokenizer):
+    """(input_ids, attention_mask) with one row per image count in n_tokens, padded to the longest
+    on the tokenizer's padding side
+    """
+    ids, pad = entry["ids"], entry["pad"]
+    n_tokens = np.asarray(n_tokens, dtype=np.int64)
+    lengths = ids.size - 1 + n_tokens
+    width = int(lengths.max())
+    input_ids = np.full((n_tokens.size, width), tokenizer.pad_token_id, dtype=np.int64)
+    attention_mask = np.zeros((n_tokens.size, width), dtype=np.int64)
+    left = getattr(tokenizer, "padding_side", "right") == "left"
+    for i, (n, length) in enumerate(zip(n_tokens, lengths)):
+        cols = slice(width - length, width) if left else slice(0, length)
+        row = input_ids[i, cols]
+        row[:pad] = ids[:pad]
+        row[pad:pad + n] = entry["pad_id"]
+        row[pad + n:] = ids[pad + 1:]
+        attention_mask[i, cols] = 1
+    return input_ids, attention_mask
+
+
+def time_call(fn, trials):
+    samples = []
+    for _ in range(trials):
+        t0 = time.perf_counter()
+        out = fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return out, float(np.median(samples))
+
+
+def compare(adapter, docs, doc_dir, trials=5):
+    """Per document: the processor's own text path vs. the cached template + splice, timed
+    and checked to give identical input_ids"""
+    cache = ChatTemplateCache()
+    processor = adapter.processor
+    ip = image_processor_of(processor)
+    rows = []
+    for cfg in docs:
+        img = open_page(doc_dir, cfg)
+        full, full_ms = time_call(lambda: processor(text=[adapter.prompt(img)], images=[img],
+                                                    return_tensors="np", padding=True), trials)
+        spliced, spliced_ms = time_call(lambda: cache.preprocess(processor, adapter.prompt_text, [img]), trials)
+        _, image_ms = time_call(lambda: ip(images=[img], return_tensors="np"), trials)
+        same = np.array_equal(np.asarray(full["input_ids"]), spliced["input_ids"])
+        rows.append({"id": cfg["id"], "prompt_tokens": int(np.asarray(full["input_ids"]).shape[1]),
+                     "full_ms": round(full_ms, 3), "cached_ms": round(spliced_ms, 3),
+                     "image_only_ms": round(image_ms, 3), "identical": bool(same)})
+        del img, full, spliced
+        gc.collect()
+    return rows, cache
+
+
+def print_compare(rows, cache):
+    print(f"\n{'Document':<26} {'Tokens':>8} {'Full':>10} {'Cached':>10} {'Image only':>11} {'Text share':>11}")
+    print("-"*82)
+    for r in rows:
+        share = (r["full_ms"] - r["image_only_ms"]) / r["full_ms"] if r["full_ms"] else 0.0
+        icon = "✅" if r["identical"] else "❌"
+        print(f"  {r['id']:<24} {r['prompt_tokens']:>8,} {r['full_ms']:>8.2f}ms {r['cached_ms']:>8.2f}ms "
+              f"{r['image_only_ms']:>9.2f}ms {share:>10.1%} {icon}")
+    print("-"*82)
+    full = sum(r["full_ms"] for r in rows)
+    cached = sum(r["cached_ms"] for r in rows)
+    print(f"  Total: {full:.1f}ms full vs {cached:.1f}ms cached → {full - cached:+.1f}ms saved "
+          f"({(1 - cached / full) if full else 0:.0%})")
+    print(f"  {cache.summary()}")
+    bad = [r["id"] for r in rows if not r["identical"]]
+    print(f"  {'⚠️ input_ids differ for ' + ', '.join(bad) if bad else '✓ input_ids identical for every document'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chat-template render cache: time it and check it against the processor")
+    parser.add_argument("--backend", help="Qwen processor backend (default: the hub processor)")
+    parser.add_argument("--offline", action="store_true", help="use the reference-qwen backend")
+    parser.add_argument("--trials", type=int, default=5, help="timed calls per document; median kept")
+    parser.add_argument("--json", help="write the per-document comparison to this path")
+    args = parser.parse_args(argv)
+
+    from test_doc_navit import DOCS, DOC_DIR
+    adapter = QwenAdapter(args.backend or ("reference-qwen" if args.offline else None))
+    print("="*70)
+    print(f"CHAT TEMPLATE CACHE — {adapter.title} ({adapter.backend}), {args.trials} trials")
+    print("="*70)
+    adapter.load()
+    rows, cache = compare(adapter, DOCS, DOC_DIR, args.trials)
+    print_compare(rows, cache)
+    adapter.unload()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"backend": adapter.backend, "trials": args.trials, "documents": rows}, f, indent=2)
+        print(f"\n Report: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
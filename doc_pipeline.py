@@ -0,0 +1,225 @@
+import io
+import time
+import queue
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+
+import generate_documents as gd
+from navit_grid import PROFILES
+from navit_driver import ADAPTERS, STATUS_ICONS, classify, expected_patches, fill_grid, make_adapter
+
+_DONE = object()
+
+
+def pipeline_docs(variants=0, seed=0):
+    """(index, v, doc) per page: the templates themselves, or `variants` seeded variants of each"""
+    if not variants:
+        return [(i, None, {k: cfg[k] for k in ("id", "width", "height", "desc")})
+                for i, cfg in enumerate(gd.DOCUMENT_CONFIGS)]
+    return [(i, v, gd.variant_doc(i, v, seed)[0])
+            for v in range(variants) for i in range(len(gd.DOCUMENT_CONFIGS))]
+
+
+def generate_raw(index, v, seed):
+    """Runs in pool workers: render a page in memory and ship it back as a raw RGB buffer"""
+    t0 = time.perf_counter()
+    img = gd.render_page(index, v, seed)
+    return img.mode, img.size, img.tobytes(), time.perf_counter() - t0
+
+
+def iter_pages(pages, seed=0, workers=1, depth=8, stats=None):
+    """Yield (doc, img, gen_seconds, error) in page order while later pages are being generated.
+
+    A page that fails to generate comes through with img None and its error message, and
+    the pages after it keep coming. At most `depth` pages are in flight: a producer that
+    gets that far ahead blocks until the consumer catches up, so memory stays bounded
+    however long the run. stats collects the seconds the consumer spent waiting and, with
+    the generator thread, the seconds the producer spent blocked (pool workers never block:
+    the window of pending futures is the queue).
+    """
+    stats = stats if stats is not None else {}
+    stats.setdefault("consumer_wait_s", 0.0)
+
+    if workers > 1:
+        # Raw buffers from worker processes; the window of pending futures is the queue
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            todo = iter(pages)
+            pending = deque()
+
+            def submit():
+                page = next(todo, None)
+                if page is not None:
+                    index, v, doc = page
+                    pending.append((doc, pool.submit(generate_raw, index, v, seed)))
+
+            for _ in range(depth):
+                submit()
+            while pending:
+                doc, future = pending.popleft()
+                t0 = time.perf_counter()
+                try:
+                    mode, size, raw, gen_s = future.result()
+                    page, error = Image.frombuffer(mode, size, raw, "raw", mode, 0, 1), None
+                except Exception as e:
+                    page, gen_s, error = None, 0.0, f"generate: {type(e).__name__}: {e}"
+                stats["consumer_wait_s"] += time.perf_counter() - t0
+                submit()
+                yield doc, page, gen_s, error
+        return
+
+    stats.setdefault("producer_blocked_s", 0.0)
+
+    q = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def offer(item):
+        """Block while the queue is full; False once the consumer has gone away"""
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for index, v, doc in pages:
+                t0 = time.perf_counter()
+                try:
+                    item = (doc, gd.render_page(index, v, seed), time.perf_counter() - t0, None)
+                except Exception as e:
+                    item = (doc, None, time.perf_counter() - t0, f"generate: {type(e).__name__}: {e}")
+                t0 = time.perf_counter()
+                if not offer(item):
+                    return
+                stats["producer_blocked_s"] += time.perf_counter() - t0
+        except Exception as e:
+            offer(e)
+            return
+        offer(_DONE)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            t0 = time.perf_counter()
+            item = q.get()
+            stats["consumer_wait_s"] += time.perf_counter() - t0
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+
+
+def png_round_trip_ms(img):
+    """What the disk path would have cost for this page: PNG encode plus decode"""
+    t0 = time.perf_counter()
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    buf.seek(0)
+    Image.open(buf).load()
+    return (time.perf_counter() - t0) * 1000
+
+
+def run_pipeline(adapter, variants=0, seed=0, workers=1, depth=8, png_baseline=False, log=print):
+    """Generate pages and preprocess them as they arrive, without writing or reading any file.
+
+    Returns (results, stats); results have the same fields as navit_driver.run_model's
+    plus gen_ms (and png_ms with png_baseline).
+    """
+    pages = pipeline_docs(variants, seed)
+    docs = [doc for _, _, doc in pages]
+    expected = expected_patches(docs, adapter.profile)
+    patch_size = PROFILES[adapter.profile]["patch_size"]
+    verbose = len(docs) <= 50
+
+    log("\n" + "="*70)
+    log(f"{adapter.title} — In-memory pipeline ({len(docs):,} pages, {workers} generator worker(s), depth {depth})")
+    log("="*70 + "\n")
+    adapter.load()
+    log(f"✓ Loaded: {type(adapter.processor).__name__} ({adapter.backend})")
+    if verbose:
+        log(f"\n{'Document':<28} {'Dims':<12} {'Expected':>8} {'Actual':>8} {'Gen':>8} {'Prep':>8} {'Status'}")
+        log("-"*84)
+
+    gd.LOG_SAVES = False
+    stats = {}
+    results = []
+    start = time.perf_counter()
+    for n, (doc, img, gen_s, error) in enumerate(iter_pages(pages, seed, workers, depth, stats)):
+        result = {"id": doc["id"], "desc": doc["desc"], "dimensions": f"{doc['width']}x{doc['height']}",
+                  "expected_tokens": expected[n], "actual_tokens": None, "grid": None,
+                  "gen_ms": round(gen_s * 1000, 2), "status": "pending"}
+        try:
+            if error:
+                raise RuntimeError(error)
+            t0 = time.perf_counter()
+            inputs = adapter.preprocess([img])
+            result["preprocess_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+            grids = adapter.extract_grids(inputs)
+            if grids:
+                fill_grid(result, doc, grids[0], patch_size)
+                result["status"] = classify(result["actual_tokens"], expected[n])
+            else:
+                result["status"] = "N/A"
+        except Exception as e:
+            result["status"] = "ERROR"
+            result["error"] = str(e)[:80]
+        if png_baseline and img is not None:
+            result["png_ms"] = round(png_round_trip_ms(img), 2)
+        results.append(result)
+
+        if verbose:
+            log(f"  {doc['id']:<26} {result['dimensions']:<12} {expected[n]:>8,} "
+                f"{str(result['actual_tokens'] or 'N/A'):>8} {result['gen_ms']:>6.0f}ms "
+                f"{result.get('preprocess_ms', 0):>6.0f}ms {STATUS_ICONS[result['status']]}")
+        elif (n + 1) % 500 == 0:
+            log(f"  ... {n + 1:,}/{len(docs):,} pages")
+    stats["wall_s"] = time.perf_counter() - start
+    adapter.unload()
+
+    passes = sum(1 for r in results if r["status"] == "PASS")
+    gen_s = sum(r["gen_ms"] for r in results) / 1000
+    prep_s = sum(r.get("preprocess_ms", 0) for r in results) / 1000
+    log("-"*84 if verbose else "")
+    log(f"{adapter.title}: {passes}/{len(results)} PASS")
+    log(f"Wall {stats['wall_s']:.2f}s ({len(results) / max(stats['wall_s'], 1e-9):.1f} pages/s): "
+        f"generate {gen_s:.2f}s, preprocess {prep_s:.2f}s summed")
+    blocked = f"producer blocked {stats['producer_blocked_s']:.2f}s, " if "producer_blocked_s" in stats else ""
+    log(f"Backpressure: {blocked}preprocessing starved {stats['consumer_wait_s']:.2f}s")
+    if png_baseline:
+        png_s = sum(r.get("png_ms", 0) for r in results) / 1000
+        log(f"PNG encode+decode avoided: {png_s:.2f}s ({png_s / max(prep_s, 1e-9):.1f}x the preprocessing time)")
+    return results, stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate documents straight into a processor, no files")
+    parser.add_argument("model", nargs="?", default="qwen", choices=list(ADAPTERS))
+    parser.add_argument("--backend", help="processor backend (default: the model's hub processor)")
+    parser.add_argument("--offline", action="store_true", help="use the reference-<model> backend")
+    parser.add_argument("--variants", type=int, default=0,
+                        help="feed N seeded variants per template instead of the 10 templates")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="generator processes (1 = one generator thread alongside preprocessing)")
+    parser.add_argument("--depth", type=int, default=8, help="max pages generated ahead of the processor")
+    parser.add_argument("--png-baseline", action="store_true",
+                        help="also time the PNG encode+decode each page would have cost on disk")
+    args = parser.parse_args(argv)
+
+    backend = args.backend or (f"reference-{args.model}" if args.offline else None)
+    run_pipeline(make_adapter(args.model, backend), args.variants, args.seed, args.workers,
+                 args.depth, args.png_baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import os
+import re
+import sys
+import glob
+import json
+
+FONT_EXTS = (".ttf", ".otf", ".ttc")
+# Fonts dropped here win over system fonts, so every machine renders the same glyphs
+BUNDLED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts")
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "navit_font_index.json")
+INDEX_VERSION = 2
+
+# File stems (lowercase, no extension) in order of preference for each (family, weight).
+# The Windows fonts come first so existing renders on Windows don't change.
+PREFERRED = {
+    "sans/regular": ["arial", "calibri", "times", "consola",
+                     "dejavusans", "liberationsans-regular", "notosans-regular", "freesans",
+                     "helvetica", "arialmt"],
+    "sans/bold": ["arialbd", "calibrib", "timesbd",
+                  "dejavusans-bold", "liberationsans-bold", "notosans-bold", "freesansbold",
+                  "arial bold", "helvetica-bold"],
+    "mono/regular": ["consola",
+                     "dejavusansmono", "liberationmono-regular", "notosansmono-regular", "freemono",
+                     "cour", "courier new", "menlo"],
+}
+
+_index = None
+
+
+def fontconfig_dirs(conf_paths=("/etc/fonts/fonts.conf",)):
+    """<dir> entries from fontconfig's config files (and their conf.d includes)"""
+    confs = list(conf_paths)
+    for conf in conf_paths:
+        confs += sorted(glob.glob(os.path.join(os.path.dirname(conf), "conf.d", "*.conf")))
+    xdg_data = os.environ.get("XDG_DATA_HOME", os.path.expanduser("~/.local/share"))
+    dirs = []
+    for conf in confs:
+        try:
+            with open(conf, encoding="utf-8", errors="ignore") as f:
+                text = f.read()
+        except OSError:
+            continue
+        for attrs, path in re.findall(r"<dir([^>]*)>([^<]+)</dir>", text):
+            path = path.strip()
+            if 'prefix="xdg"' in attrs:
+                path = os.path.join(xdg_data, path)
+            dirs.append(os.path.expanduser(path))
+    return dirs
+
+
+def system_font_dirs():
+    """Existing font directories for this platform, most specific first, without duplicates"""
+    home = os.path.expanduser("~")
+    if sys.platform == "win32":
+        windir = os.environ.get("WINDIR", "C:/Windows")
+        candidates = [os.path.join(windir, "Fonts"),
+                      os.path.join(os.environ.get("LOCALAPPDATA", ""), "Microsoft", "Windows", "Fonts")]
+    elif sys.platform == "darwin":
+        candidates = [os.path.join(home, "Library", "Fonts"), "/Library/Fonts",
+                      "/System/Library/Fonts", "/System/Library/Fonts/Supplemental"]
+    else:
+        candidates = fontconfig_dirs() + [os.path.join(home, ".local", "share", "fonts"),
+                                          os.path.join(home, ".fonts"),
+                                          "/usr/local/share/fonts", "/usr/share/fonts"]
+    seen, dirs = set(), []
+    for d in candidates:
+        real = os.path.realpath(d)
+        if real not in seen and os.path.isdir(real):
+            seen.add(real)
+            dirs.append(real)
+    return dirs
+
+
+def scan(dirs, mtimes=None):
+    """{lowercase file stem: path} for every font file under dirs; earlier dirs win.
+    mtimes, if given, collects the mtime of every directory walked.
+    """
+    fonts = {}
+    for root in dirs:
+        for dirpath, _, files in os.walk(root):
+            if mtimes is not None:
+                mtimes[dirpath] = os.stat(dirpath).st_mtime
+            for name in sorted(files):
+                stem, ext = os.path.splitext(name)
+                if ext.lower() in FONT_EXTS:
+                    fonts.setdefault(stem.lower(), os.path.join(dirpath, name))
+    return fonts
+
+
+def build_index(bundled_dir=BUNDLED_DIR):
+    """Scan bundled and system fonts and resolve every PREFERRED key to a file"""
+    bundled_dirs = [bundled_dir] if os.path.isdir(bundled_dir) else []
+    dirs = system_font_dirs()
+    mtimes = {}
+    bundled, system = scan(bundled_dirs, mtimes), scan(dirs, mtimes)
+
+    lookup = {}
+    for key, stems in PREFERRED.items():
+        lookup[key] = (next((bundled[s] for s in stems if s in bundled), None)
+                       or next((system[s] for s in stems if s in system), None))
+    return {
+        "version": INDEX_VERSION,
+        "roots": dirs,
+        # A font added to a subdirectory only bumps that subdirectory's mtime
+        "dirs": mtimes,
+        "bundled": bundled,
+        "system": system,
+        "lookup": lookup,
+    }
+
+
+def _is_fresh(index, bundled_dir):
+    if index.get("version") != INDEX_VERSION:
+        return False
+    walked = index.get("dirs", {})
+    if os.path.isdir(bundled_dir) != (bundled_dir in walked):
+        return False
+    if index.get("roots") != system_font_dirs():
+        return False
+    for d, mtime in walked.items():
+        try:
+            if os.stat(d).st_mtime != mtime:
+                return False
+        except OSError:
+            return False
+    # Every indexed file must still be there
+    return all(p is None or os.path.exists(p) for p in index["lookup"].values())
+
+
+def load_index(rebuild=False, cache_path=CACHE_PATH, bundled_dir=BUNDLED_DIR):
+    """The font index, read from cache_path when still valid, else rebuilt and saved there"""
+    global _index
+    if _index is not None and not rebuild:
+        return _index
+
+    index = None
+    if not rebuild and os.path.exists(cache_path):
+        try:
+            with open(cache_path, encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = None
+        if index is not None and not _is_fresh(index, bundled_dir):
+            index = None
+
+    if index is None:
+        index = build_index(bundled_dir)
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(cache_path, "w", encoding="utf-8") as f:
+                json.dump(index, f, indent=1, sort_keys=True)
+        except OSError:
+            pass
+
+    _index = index
+    return index
+
+
+def lookup(family, weight):
+    """Font file for (family, weight), or None if no preferred font is installed"""
+    return load_index()["lookup"].get(f"{family}/{weight}")
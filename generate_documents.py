@@ -1,45 +1,136 @@
 import os
+import json
+import time
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image, ImageDraw, ImageFont
+import numpy as np
 import random
 import math
 
+import font_index
+from packed_corpus import PackedWriter
+
 OUTPUT_DIR = "stress_test_documents"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
+CORPUS_DIR = os.path.join(OUTPUT_DIR, "corpus")
+MANIFEST_FILE = "manifest.jsonl"
+
+# Variant pages scale each template's area and aspect ratio log-uniformly within these factors
+VARIANT_AREA_RANGE = (0.5, 2.0)
+VARIANT_ASPECT_RANGE = (2 / 3, 1.5)
+VARIANT_MIN_SIDE = 32
+
+# "packed" pages go to one contiguous PACKED_FILE (see packed_corpus.py) instead of a file each
+OUTPUT_FORMATS = {"png": ".png", "webp": ".webp", "npy": ".npy", "packed": None}
+PACKED_FILE = "pages.bin"
+
+# Where to look when a family has no font file installed
+FONT_FALLBACKS = {
+    ("sans", "bold"): ("sans", "regular"),
+    ("mono", "regular"): ("sans", "regular"),
+}
+FONT_CACHE_SIZE = 64
+
+_font_paths = {}
+_font_cache = OrderedDict()
+FONT_CACHE_STATS = {"hits": 0, "misses": 0, "evictions": 0}
+
+# Corpus mode renders thousands of pages; it turns the per-page ✓ line off
+LOG_SAVES = True
+
+
+def resolve_font_path(family, weight):
+    """Font file for (family, weight), following fallbacks; None means PIL's default font"""
+    key = (family, weight)
+    if key not in _font_paths:
+        path = font_index.lookup(family, weight)
+        if path is None and key in FONT_FALLBACKS:
+            path = resolve_font_path(*FONT_FALLBACKS[key])
+        _font_paths[key] = path
+    return _font_paths[key]
+
+
+def load_font(family, weight, size):
+    """Memoized font by (family, weight, size) with LRU eviction past FONT_CACHE_SIZE"""
+    key = (family, weight, size)
+    font = _font_cache.get(key)
+    if font is not None:
+        _font_cache.move_to_end(key)
+        FONT_CACHE_STATS["hits"] += 1
+        return font
+    
+    FONT_CACHE_STATS["misses"] += 1
+    path = resolve_font_path(family, weight)
+    font = ImageFont.truetype(path, size) if path else ImageFont.load_default()
+    _font_cache[key] = font
+    if len(_font_cache) > FONT_CACHE_SIZE:
+        _font_cache.popitem(last=False)
+        FONT_CACHE_STATS["evictions"] += 1
+    return font
 
 def get_font(size):
-    font_paths = [
-        "C:/Windows/Fonts/arial.ttf",
-        "C:/Windows/Fonts/calibri.ttf",
-        "C:/Windows/Fonts/times.ttf",
-        "C:/Windows/Fonts/consola.ttf",
-    ]
-    for fp in font_paths:
-        try:
-            return ImageFont.truetype(fp, size)
-        except:
-            continue
-    return ImageFont.load_default()
+    return load_font("sans", "regular", size)
 
 def get_bold_font(size):
-    font_paths = [
-        "C:/Windows/Fonts/arialbd.ttf",
-        "C:/Windows/Fonts/calibrib.ttf",
-        "C:/Windows/Fonts/timesbd.ttf",
-    ]
-    for fp in font_paths:
-        try:
-            return ImageFont.truetype(fp, size)
-        except:
-            continue
-    return get_font(size)
+    return load_font("sans", "bold", size)
 
 def get_mono_font(size):
-    try:
-        return ImageFont.truetype("C:/Windows/Fonts/consola.ttf", size)
-    except:
-        return get_font(size)
+    return load_font("mono", "regular", size)
+
+
+def vary_rows(rows, rng, min_frac=0.5, shuffle=False):
+    """rows unchanged without rng; otherwise a random subset of at least min_frac of them, in order unless shuffle"""
+    if rng is None:
+        return rows
+    k = rng.randint(max(1, math.ceil(len(rows) * min_frac)), len(rows))
+    picked = sorted(rng.sample(range(len(rows)), k))
+    if shuffle:
+        rng.shuffle(picked)
+    return [rows[i] for i in picked]
 
-def generate_long_receipt(width, height, output_path):
+
+def vary_amount(value, rng, spread=0.3):
+    """Numeric string scaled by a random factor within ±spread, keeping its decimals"""
+    if rng is None:
+        return value
+    decimals = len(value.split(".")[1]) if "." in value else 0
+    return f"{float(value) * rng.uniform(1 - spread, 1 + spread):.{decimals}f}"
+
+
+def encode_page(img, stem, fmt="png", compress_level=None):
+    """Write img to stem + the format's extension; returns (path, encode seconds, bytes written).
+
+    compress_level is zlib's 0-9 for png and the 0-6 effort ("method") for lossless webp;
+    None keeps PIL's default.
+    """
+    path = stem + OUTPUT_FORMATS[fmt]
+    t0 = time.perf_counter()
+    if fmt == "png":
+        img.save(path, **({} if compress_level is None else {"compress_level": compress_level}))
+    elif fmt == "webp":
+        img.save(path, lossless=True, **({} if compress_level is None else {"method": min(compress_level, 6)}))
+    elif fmt == "npy":
+        np.save(path, np.asarray(img))
+    else:
+        raise ValueError(f"{fmt} pages are not written one file per page")
+    seconds = time.perf_counter() - t0
+    if LOG_SAVES:
+        print(f"  ✓ {os.path.basename(path)} ({img.width}x{img.height})")
+    return path, seconds, os.path.getsize(path)
+
+
+def save_document(img, output_path):
+    """Save img to output_path and return it; with output_path None the page stays in memory"""
+    if output_path is None:
+        return img
+    img.save(output_path)
+    if LOG_SAVES:
+        print(f"  ✓ {os.path.basename(output_path)} ({img.width}x{img.height})")
+    return img
+
+def generate_long_receipt(width, height, output_path, rng=None):
     """01: Long receipt (100x2800) - extreme vertical"""
     img = Image.new('RGB', (width, height), '#FFFEF5')
     draw = ImageDraw.Draw(img)
@@ -105,6 +196,8 @@ def generate_long_receipt(width, height, output_path):
         ("Dentifrice", "18.00"), ("Shampooing 400ml", "28.00"),
         ("Lessive 2kg", "45.00"), ("Sacs poubelle x20", "8.00"),
     ]
+    if rng is not None:
+        items = [(name, vary_amount(price, rng)) for name, price in rng.choices(items, k=rng.randint(10, 3 * len(items)))]
     
     max_items = min(len(items), (height - y - 200) // (small_font.size + 3))
     
@@ -150,11 +243,10 @@ def generate_long_receipt(width, height, output_path):
     y += body_font.size + 3
     draw.text((width//2, y), "A bientot!", font=small_font, fill='#666', anchor='mt')
     
-    img.save(output_path)
-    print(f"  ✓ {os.path.basename(output_path)} ({width}x{height})")
+    return save_document(img, output_path)
 
 
-def generate_wide_spreadsheet(width, height, output_path):
+def generate_wide_spreadsheet(width, height, output_path, rng=None):
     """02: Wide spreadsheet (2800x100) - extreme horizontal"""
     img = Image.new('RGB', (width, height), 'white')
     draw = ImageDraw.Draw(img)
@@ -192,6 +284,7 @@ def generate_wide_spreadsheet(width, height, output_path):
          "22000", "2019-06", "Actif", "K.Alami", "B1-102",
          "1", "A-2941", "P-18", "+212 5372", "Senior"],
     ]
+    row_data = [row[:10] + [vary_amount(row[10], rng)] + row[11:] for row in vary_rows(row_data, rng, shuffle=True)]
     
     row_h = (height - height//3) // 2
     for r, data in enumerate(row_data):
@@ -208,11 +301,10 @@ def generate_wide_spreadsheet(width, height, output_path):
         y = height//3 + r * row_h
         draw.line([(0, y), (width, y)], fill='#BDC3C7', width=1)
     
-    img.save(output_path)
-    print(f"  ✓ {os.path.basename(output_path)} ({width}x{height})")
+    return save_document(img, output_path)
 
 
-def generate_a4_research_paper(width, height, output_path):
+def generate_a4_research_paper(width, height, output_path, rng=None):
     """03: A4 research paper (595x842)"""
     img = Image.new('RGB', (width, height), 'white')
     draw = ImageDraw.Draw(img)
@@ -259,6 +351,7 @@ def generate_a4_research_paper(width, height, output_path):
         "native resolutions, with GLM-OCR achieving SOTA accuracy",
         "of 94.62 on OmniDocBench V1.5.",
     ]
+    abstract = vary_rows(abstract, rng, 0.6)
     for line in abstract:
         draw.text((margin, y), line, font=body_font, fill='#333')
         y += 12
@@ -295,6 +388,7 @@ def generate_a4_research_paper(width, height, output_path):
         "models: GLM-OCR (0.9B), Qwen2.5-VL",
         "(3B), and PaddleOCR-VL (0.9B).",
     ]
+    intro_lines = vary_rows(intro_lines, rng, 0.6)
     for line in intro_lines:
         draw.text((lx, ly), line, font=body_font, fill='#333')
         ly += 11
@@ -316,6 +410,7 @@ def generate_a4_research_paper(width, height, output_path):
         "(256, 576, 1024), it indicates a",
         "forced resize has occurred.",
     ]
+    method_lines = vary_rows(method_lines, rng, 0.6)
     for line in method_lines:
         draw.text((lx, ly), line, font=body_font, fill='#333')
         ly += 11
@@ -343,6 +438,7 @@ def generate_a4_research_paper(width, height, output_path):
         "- PaddleOCR-VL uses a documented",
         "  NaViT-style dynamic encoder",
     ]
+    results_lines = vary_rows(results_lines, rng, 0.6)
     for line in results_lines:
         draw.text((rx, ry), line, font=body_font, fill='#333')
         ry += 11
@@ -365,6 +461,7 @@ def generate_a4_research_paper(width, height, output_path):
         "[2] GLM-OCR Technical Report, 2026",
         "[3] Qwen2.5-VL Paper, 2025",
     ]
+    conclusion_lines = vary_rows(conclusion_lines, rng, 0.6)
     for line in conclusion_lines:
         draw.text((rx, ry), line, font=body_font, fill='#333')
         ry += 11
@@ -376,11 +473,10 @@ def generate_a4_research_paper(width, height, output_path):
     # Page number
     draw.text((width//2, height - 20), "- 1 -", font=small_font, fill='#999', anchor='mt')
     
-    img.save(output_path)
-    print(f"  ✓ {os.path.basename(output_path)} ({width}x{height})")
+    return save_document(img, output_path)
 
 
-def generate_id_card(width, height, output_path):
+def generate_id_card(width, height, output_path, rng=None):
     """04: ID card / business card (512x512) - square"""
     img = Image.new('RGB', (width, height), '#1A237E')
     draw = ImageDraw.Draw(img)
@@ -419,6 +515,7 @@ def generate_id_card(width, height, output_path):
         ("CIN:", "BK 482917"),
         ("Validité:", "12/2030"),
     ]
+    fields = vary_rows(fields, rng, 0.67)
     
     for label, value in fields:
         draw.text((ix, iy), label, font=small_font, fill='#90CAF9')
@@ -434,11 +531,10 @@ def generate_id_card(width, height, output_path):
     draw.text((10, mrz_y + 18), "BK482917<3MAR9005124M3012305<<<<<<<<<08", font=mrz_font, fill='#90CAF9')
     draw.text((10, mrz_y + 31), "<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<", font=mrz_font, fill='#90CAF9')
     
-    img.save(output_path)
-    print(f"  ✓ {os.path.basename(output_path)} ({width}x{height})")
+    return save_document(img, output_path)
 
 
-def generate_narrow_invoice(width, height, output_path):
+def generate_narrow_invoice(width, height, output_path, rng=None):
     """05: Narrow invoice (140x2100) - skyscraper"""
     img = Image.new('RGB', (width, height), 'white')
     draw = ImageDraw.Draw(img)
@@ -485,6 +581,7 @@ def generate_narrow_invoice(width, height, output_path):
         ("Mobile App", "8000"), ("Push Notif", "1000"), ("Auth Syst", "2500"),
         ("Dashboard", "3500"), ("Reporting", "2000"), ("Export PDF", "1500"),
     ]
+    items = [(name, vary_amount(price, rng)) for name, price in vary_rows(items, rng, 0.4, shuffle=True)]
     
     max_items = min(len(items), (height - y - 150) // (small_font.size + 3))
     
@@ -508,11 +605,10 @@ def generate_narrow_invoice(width, height, output_path):
     draw.text((3, y), "TTC:", font=title_font, fill='#E53935')
     draw.text((width-3, y), f"{int(total*1.2)}", font=title_font, fill='#E53935', anchor='rt')
     
-    img.save(output_path)
-    print(f"  ✓ {os.path.basename(output_path)} ({width}x{height})")
+    return save_document(img, output_path)
 
 
-def generate_panoramic_timeline(width, height, output_path):
+def generate_panoramic_timeline(width, height, output_path, rng=None):
     """06: Panoramic timeline (3500x70) - extreme horizontal"""
     img = Image.new('RGB', (width, height), '#FAFAFA')
     draw = ImageDraw.Draw(img)
@@ -536,6 +632,7 @@ def generate_panoramic_timeline(width, height, output_path):
         ("Jun 2026", "Global Launch"), ("Aug 2026", "100K Users"),
         ("Oct 2026", "Enterprise"), ("Dec 2026", "IPO Prep"),
     ]
+    events = vary_rows(events, rng)
     
     spacing = (width - 140) // len(events)
     
@@ -553,11 +650,10 @@ def generate_panoramic_timeline(width, height, output_path):
             draw.text((x, bar_y+18), date, font=font, fill='#1565C0', anchor='mt')
             draw.text((x, bar_y-10), event, font=font, fill='#333', anchor='mb')
     
-    img.save(output_path)
-    print(f"  ✓ {os.path.basename(output_path)} ({width}x{height})")
+    return save_document(img, output_path)
 
 
-def generate_mobile_form(width, height, output_path):
+def generate_mobile_form(width, height, output_path, rng=None):
     """07: Mobile form (375x812) - phone screenshot"""
     img = Image.new('RGB', (width, height), '#F5F5F5')
     draw = ImageDraw.Draw(img)
@@ -591,6 +687,7 @@ def generate_mobile_form(width, height, output_path):
         ("Mot de passe", "••••••••••••"),
         ("Confirmer", "••••••••••••"),
     ]
+    fields = vary_rows(fields, rng)
     
     for label, value in fields:
         draw.text((margin, y), label, font=label_font, fill='#666')
@@ -618,11 +715,10 @@ def generate_mobile_form(width, height, output_path):
     # Home indicator
     draw.rounded_rectangle([(width//2 - 40, height - 8), (width//2 + 40, height - 4)], radius=2, fill='#CCC')
     
-    img.save(output_path)
-    print(f"  ✓ {os.path.basename(output_path)} ({width}x{height})")
+    return save_document(img, output_path)
 
 
-def generate_financial_report(width, height, output_path):
+def generate_financial_report(width, height, output_path, rng=None):
     """08: Financial report (3840x2160) - 4K"""
     img = Image.new('RGB', (width, height), 'white')
     draw = ImageDraw.Draw(img)
@@ -656,6 +752,7 @@ def generate_financial_report(width, height, output_path):
         "Cette performance est le résultat de notre stratégie de diversification et d'innovation technologique.",
         "Le résultat net consolidé s'établit à 340 millions MAD, en hausse de 22% par rapport à 2024.",
     ]
+    summary = vary_rows(summary, rng)
     for line in summary:
         draw.text((margin, y), line, font=body_font, fill='#333')
         y += 28
@@ -688,6 +785,7 @@ def generate_financial_report(width, height, output_path):
         ["Dette nette / EBITDA", "1.8x", "2.1x", "-0.3x", "1.5x"],
         ["Dividende par action", "45 MAD", "38 MAD", "+18.4%", "52 MAD"],
     ]
+    rows = vary_rows(rows, rng)
     
     for r, row in enumerate(rows):
         bg = '#F5F5F5' if r % 2 == 0 else 'white'
@@ -713,6 +811,7 @@ def generate_financial_report(width, height, output_path):
         ("Industrie", 320, '#6A1B9A'),
         ("Services", 130, '#00838F'),
     ]
+    segments = [(name, int(vary_amount(str(value), rng)), color) for name, value, color in vary_rows(segments, rng, 0.6)]
     
     bar_max_w = 800
     max_val = max(s[1] for s in segments)
@@ -743,6 +842,7 @@ def generate_financial_report(width, height, output_path):
         "• Certification ISO 27001",
         "• Introduction en bourse prévue T4 2026",
     ]
+    perspectives = vary_rows(perspectives, rng, 0.4, shuffle=True)
     for p in perspectives:
         draw.text((rx, ry), p, font=body_font, fill='#333')
         ry += 30
@@ -758,6 +858,7 @@ def generate_financial_report(width, height, output_path):
         ("CTO", "M. Omar Alami"),
         ("DRH", "Mme Fatima Zahra Bennani"),
     ]
+    board = vary_rows(board, rng, 0.6)
     for title, name in board:
         draw.text((rx, ry), f"{title}:", font=table_font, fill='#666')
         draw.text((rx + 200, ry), name, font=table_font, fill='#333')
@@ -768,11 +869,10 @@ def generate_financial_report(width, height, output_path):
     draw.text((margin, height - 38), "© 2026 Groupe Benali Holdings - Document Confidentiel", font=small_font, fill='white')
     draw.text((width - margin, height - 38), "Page 1/12", font=small_font, fill='#90CAF9', anchor='rt')
     
-    img.save(output_path)
-    print(f"  ✓ {os.path.basename(output_path)} ({width}x{height})")
+    return save_document(img, output_path)
 
 
-def generate_medical_prescription(width, height, output_path):
+def generate_medical_prescription(width, height, output_path, rng=None):
     """09: Medical prescription (987x610) - golden ratio"""
     img = Image.new('RGB', (width, height), '#FFFDE7')
     draw = ImageDraw.Draw(img)
@@ -822,6 +922,8 @@ def generate_medical_prescription(width, height, output_path):
         ("3.", "OMÉPRAZOLE 20mg", "1 gélule le matin à jeun pendant 14 jours", "30 min avant le petit-déjeuner"),
         ("4.", "VITAMINE D3 100.000 UI", "1 ampoule par mois pendant 3 mois", "À prendre avec un repas gras"),
     ]
+    if rng is not None:
+        prescriptions = [(f"{i}.", *p[1:]) for i, p in enumerate(vary_rows(prescriptions, rng, 0.25, shuffle=True), 1)]
     
     for num, med, posology, note in prescriptions:
         draw.text((margin, y), num, font=h2_font, fill='#4CAF50')
@@ -851,11 +953,10 @@ def generate_medical_prescription(width, height, output_path):
     draw.ellipse([(width - margin - 130, height - 80), (width - margin - 50, height - 20)], outline='#4CAF50', width=2)
     draw.text((width - margin - 90, height - 55), "INPE", font=small_font, fill='#4CAF50', anchor='mm')
     
-    img.save(output_path)
-    print(f"  ✓ {os.path.basename(output_path)} ({width}x{height})")
+    return save_document(img, output_path)
 
 
-def generate_stamp(width, height, output_path):
+def generate_stamp(width, height, output_path, rng=None):
     """10: Postage stamp (64x64) - tiny"""
     img = Image.new('RGB', (width, height), '#FBE9E7')
     draw = ImageDraw.Draw(img)
@@ -880,11 +981,10 @@ def generate_stamp(width, height, output_path):
     draw.polygon([(cx, cy-8), (cx+7, cy+5), (cx-7, cy+5)], fill='#1B5E20')
     
     # Value
-    draw.text((width//2, height-12), "3.75", font=font_val, fill='#B71C1C', anchor='mb')
+    draw.text((width//2, height-12), vary_amount("3.75", rng), font=font_val, fill='#B71C1C', anchor='mb')
     draw.text((width//2, height-5), "MAD", font=font_tiny, fill='#333', anchor='mb')
     
-    img.save(output_path)
-    print(f"  ✓ {os.path.basename(output_path)} ({width}x{height})")
+    return save_document(img, output_path)
 
 
 DOCUMENT_CONFIGS = [
@@ -900,27 +1000,249 @@ DOCUMENT_CONFIGS = [
     {"id": "10_postage_stamp",       "width": 64,   "height": 64,   "gen": generate_stamp,              "desc": "Postage stamp (tiny)"},
 ]
 
-def main():
+def encode_result(result, img, stem, fmt, compress_level):
+    """Encode a rendered page into result; packed pages travel back as a raw buffer instead"""
+    if fmt == "packed":
+        result["raw"] = (img.mode, img.size, img.tobytes())
+        return
+    path, seconds, size = encode_page(img, stem, fmt, compress_level)
+    result.update(path=os.path.basename(path), encode_seconds=seconds, bytes=size)
+
+
+def pack_result(writer, result, desc=None):
+    """Append a result's raw page to the packed file, recording encode time and size like a file format"""
+    mode, size, raw = result.pop("raw")
+    t0 = time.perf_counter()
+    entry = writer.write(result["id"], mode, size, raw, desc)
+    result.update(path=os.path.basename(writer.path), offset=entry["offset"],
+                  encode_seconds=time.perf_counter() - t0, bytes=len(raw))
+
+
+def render_document(index, fmt="png", compress_level=None):
+    """Render DOCUMENT_CONFIGS[index] to OUTPUT_DIR and time it (runs in pool workers too)"""
+    cfg = DOCUMENT_CONFIGS[index]
+    fonts_before = dict(FONT_CACHE_STATS)
+    result = {"id": cfg["id"], "encode_seconds": 0.0, "bytes": 0}
+    start = time.perf_counter()
+    try:
+        img = cfg["gen"](cfg["width"], cfg["height"], None)
+        result["seconds"] = time.perf_counter() - start
+        encode_result(result, img, os.path.join(OUTPUT_DIR, cfg["id"]), fmt, compress_level)
+        result["error"] = None
+    except Exception as e:
+        result.setdefault("seconds", time.perf_counter() - start)
+        result["error"] = str(e)
+    result["fonts"] = {k: FONT_CACHE_STATS[k] - fonts_before[k] for k in FONT_CACHE_STATS}
+    return result
+
+
+def render_all(workers=1, fmt="png", compress_level=None):
+    """Render every document, returning render stats in DOCUMENT_CONFIGS order"""
+    indices = range(len(DOCUMENT_CONFIGS))
+    if workers <= 1:
+        renders = [render_document(i, fmt, compress_level) for i in indices]
+    else:
+        # Submit largest pages first so the 4K report doesn't start last and set the wall time
+        by_area = sorted(indices, key=lambda i: -DOCUMENT_CONFIGS[i]["width"] * DOCUMENT_CONFIGS[i]["height"])
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {i: pool.submit(render_document, i, fmt, compress_level) for i in by_area}
+            renders = [futures[i].result() for i in indices]
+    
+    if fmt == "packed":
+        with PackedWriter(os.path.join(OUTPUT_DIR, PACKED_FILE)) as writer:
+            for cfg, r in zip(DOCUMENT_CONFIGS, renders):
+                if "raw" in r:
+                    pack_result(writer, r, cfg["desc"])
+    return renders
+
+
+def log_uniform(rng, lo, hi):
+    return math.exp(rng.uniform(math.log(lo), math.log(hi)))
+
+
+def variant_size(cfg, rng):
+    """Random (width, height) around a template's size: area and aspect ratio both jittered"""
+    area = cfg["width"] * cfg["height"] * log_uniform(rng, *VARIANT_AREA_RANGE)
+    aspect = cfg["width"] / cfg["height"] * log_uniform(rng, *VARIANT_ASPECT_RANGE)
+    return (max(VARIANT_MIN_SIDE, round(math.sqrt(area * aspect))),
+            max(VARIANT_MIN_SIDE, round(math.sqrt(area / aspect))))
+
+
+def variant_doc(index, v, seed):
+    """(doc, rng) for variant v of DOCUMENT_CONFIGS[index]; rng then draws the page content.
+
+    Everything depends only on (seed, template id, v), so a corpus is the same
+    whatever the worker count or the order pages finish in.
+    """
+    cfg = DOCUMENT_CONFIGS[index]
+    rng = random.Random(f"{seed}:{cfg['id']}:{v}")
+    width, height = variant_size(cfg, rng)
+    doc = {"id": f"{cfg['id']}_v{v:05d}", "template": cfg["id"], "variant": v, "seed": seed,
+           "width": width, "height": height, "desc": cfg["desc"]}
+    return doc, rng
+
+
+def render_page(index, v=None, seed=0, output_path=None):
+    """Page image for a template (v None) or one of its variants, saved only if output_path is given"""
+    cfg = DOCUMENT_CONFIGS[index]
+    if v is None:
+        return cfg["gen"](cfg["width"], cfg["height"], output_path)
+    doc, rng = variant_doc(index, v, seed)
+    return cfg["gen"](doc["width"], doc["height"], output_path, rng)
+
+
+def render_variant(task):
+    """Render variant v of DOCUMENT_CONFIGS[index] into corpus_dir and return its manifest entry"""
+    global LOG_SAVES
+    LOG_SAVES = False
+    index, v, seed, corpus_dir, fmt, compress_level = task
+    doc, _ = variant_doc(index, v, seed)
+    entry = {k: doc[k] for k in ("id", "template", "variant", "seed", "width", "height")}
+    entry.update(encode_seconds=0.0, bytes=0)
+    start = time.perf_counter()
+    try:
+        img = render_page(index, v, seed)
+        entry["seconds"] = time.perf_counter() - start
+        encode_result(entry, img, os.path.join(corpus_dir, doc["id"]), fmt, compress_level)
+        entry["error"] = None
+    except Exception as e:
+        entry.setdefault("seconds", time.perf_counter() - start)
+        entry["error"] = str(e)
+    return entry
+
+
+def render_corpus(variants, seed, workers=1, corpus_dir=CORPUS_DIR, fmt="png", compress_level=None):
+    """Render `variants` pages per template, streaming one manifest line per page as it lands.
+
+    Returns the manifest entries in (variant, template) order.
+    """
+    os.makedirs(corpus_dir, exist_ok=True)
+    tasks = [(i, v, seed, corpus_dir, fmt, compress_level)
+             for v in range(variants) for i in range(len(DOCUMENT_CONFIGS))]
+    entries = []
+    writer = PackedWriter(os.path.join(corpus_dir, PACKED_FILE)) if fmt == "packed" else None
+    descs = {cfg["id"]: cfg["desc"] for cfg in DOCUMENT_CONFIGS}
+    with open(os.path.join(corpus_dir, MANIFEST_FILE), "w", encoding="utf-8") as manifest:
+        if workers <= 1:
+            pages = map(render_variant, tasks)
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers)
+            pages = pool.map(render_variant, tasks, chunksize=4)
+        try:
+            for n, entry in enumerate(pages, 1):
+                if "raw" in entry:
+                    pack_result(writer, entry, descs[entry["template"]])
+                for key in ("seconds", "encode_seconds"):
+                    entry[key] = round(entry[key], 4)
+                manifest.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                manifest.flush()
+                entries.append(entry)
+                if n % 500 == 0:
+                    print(f"  ... {n:,}/{len(tasks):,} pages")
+        finally:
+            if workers > 1:
+                pool.shutdown()
+            if writer:
+                writer.close()
+    return entries
+
+
+def print_encode_totals(renders, fmt, compress_level=None):
+    done = [r for r in renders if not r["error"]]
+    encode = sum(r["encode_seconds"] for r in done)
+    size = sum(r["bytes"] for r in done)
+    level = "" if compress_level is None else f", level {compress_level}"
+    print(f"Encode ({fmt}{level}): {encode:.2f}s, {size / 2**20:.1f} MiB on disk")
+
+
+def print_corpus(entries, corpus_dir, wall, workers, fmt="png"):
+    failed = [e for e in entries if e["error"]]
+    for e in failed[:20]:
+        print(f"  ✗ {e['id']}: {e['error']}")
+    print(f"\n✅ {len(entries) - len(failed):,}/{len(entries):,} pages generated in '{corpus_dir}/' "
+          f"(manifest: {MANIFEST_FILE})\n")
+    
+    print(f"{'Template':<25} {'Pages':>6} {'Width':>12} {'Height':>12} {'Aspect':>14} {'Render':>8} {'Encode':>8} {'Size':>10}")
+    print("-"*104)
+    for cfg in DOCUMENT_CONFIGS:
+        pages = [e for e in entries if e["template"] == cfg["id"]]
+        if not pages:
+            continue
+        ws, hs = [e["width"] for e in pages], [e["height"] for e in pages]
+        ratios = [e["width"] / e["height"] for e in pages]
+        avg = sum(e["seconds"] for e in pages) / len(pages)
+        enc = sum(e["encode_seconds"] for e in pages) / len(pages)
+        size = sum(e["bytes"] for e in pages)
+        print(f"{cfg['id']:<25} {len(pages):>6} {min(ws):>5}-{max(ws):<6} {min(hs):>5}-{max(hs):<6} "
+              f"{min(ratios):>6.2f}-{max(ratios):<7.2f} {avg*1000:>6.0f}ms {enc*1000:>6.1f}ms {size / 2**20:>7.1f}MiB")
+    print("-"*104)
+    print(f"Wall time: {wall:.2f}s ({len(entries) / max(wall, 1e-9):.1f} pages/s, {workers} worker(s))")
+    print_encode_totals(entries, fmt)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate realistic document images")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes (default: 1, sequential)")
+    parser.add_argument("--rebuild-font-index", action="store_true",
+                        help="rescan font directories instead of using the cached font index")
+    parser.add_argument("--variants", type=int, default=0,
+                        help="corpus mode: render N randomized variants of every template")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="corpus seed; the same seed reproduces the same pages (default: 0)")
+    parser.add_argument("--format", default="png", choices=list(OUTPUT_FORMATS),
+                        help=f"page format: png, lossless webp, raw npy, or one packed uint8 file ({PACKED_FILE})")
+    parser.add_argument("--compress-level", type=int, choices=range(10), metavar="0-9",
+                        help="png zlib level (webp: effort, capped at 6); default: PIL's")
+    parser.add_argument("--corpus-dir", default=CORPUS_DIR,
+                        help=f"where corpus pages and {MANIFEST_FILE} go (default: {CORPUS_DIR})")
+    args = parser.parse_args(argv)
+    
     print("="*60)
     print("GENERATING REALISTIC DOCUMENT IMAGES")
     print("="*60 + "\n")
     
-    for cfg in DOCUMENT_CONFIGS:
-        try:
-            path = os.path.join(OUTPUT_DIR, f"{cfg['id']}.png")
-            cfg["gen"](cfg["width"], cfg["height"], path)
-        except Exception as e:
-            print(f"  ✗ {cfg['id']}: {e}")
-    
-    print(f"\n✅ {len(DOCUMENT_CONFIGS)} documents generated in '{OUTPUT_DIR}/'\n")
-    
-    print(f"{'#':<4} {'Document':<25} {'Dimensions':<15} {'Aspect':<8} {'Description'}")
-    print("-"*80)
-    for i, cfg in enumerate(DOCUMENT_CONFIGS, 1):
+    # Build (or load) the index once here so pool workers only read the cache file
+    index = font_index.load_index(rebuild=args.rebuild_font_index)
+    for key, path in sorted(index["lookup"].items()):
+        print(f"  font {key:<13} {path or 'PIL default (no font found)'}")
+    print()
+    
+    if args.variants > 0:
+        print(f"Corpus: {args.variants} variant(s) x {len(DOCUMENT_CONFIGS)} templates, seed {args.seed}")
+        start = time.perf_counter()
+        entries = render_corpus(args.variants, args.seed, args.workers, args.corpus_dir,
+                                args.format, args.compress_level)
+        print_corpus(entries, args.corpus_dir, time.perf_counter() - start, args.workers, args.format)
+        return
+    
+    start = time.perf_counter()
+    renders = render_all(args.workers, args.format, args.compress_level)
+    wall = time.perf_counter() - start
+    
+    for r in renders:
+        if r["error"]:
+            print(f"  ✗ {r['id']}: {r['error']}")
+    
+    ok = sum(1 for r in renders if not r["error"])
+    print(f"\n✅ {ok}/{len(DOCUMENT_CONFIGS)} documents generated in '{OUTPUT_DIR}/'\n")
+    
+    print(f"{'#':<4} {'Document':<25} {'Dimensions':<15} {'Aspect':<8} {'Render':>9} {'Encode':>9} {'Size':>10}  {'Description'}")
+    print("-"*110)
+    for i, (cfg, r) in enumerate(zip(DOCUMENT_CONFIGS, renders), 1):
         w, h = cfg["width"], cfg["height"]
         ratio = max(w,h) / min(w,h)
         orient = "H" if w > h else "V" if h > w else "S"
-        print(f"{i:<4} {cfg['id']:<25} {w}x{h:<10} {ratio:.1f}:1 {orient}  {cfg['desc']}")
+        print(f"{i:<4} {cfg['id']:<25} {w}x{h:<10} {ratio:.1f}:1 {orient} {r['seconds']*1000:>7.0f}ms "
+              f"{r['encode_seconds']*1000:>7.1f}ms {r['bytes'] / 1024:>7.0f}KiB  {cfg['desc']}")
+    
+    total = sum(r["seconds"] for r in renders)
+    print("-"*110)
+    print(f"Render time: {total:.2f}s summed, {wall:.2f}s wall ({args.workers} worker(s), {total / max(wall, 1e-9):.1f}x)")
+    hits = sum(r["fonts"]["hits"] for r in renders)
+    misses = sum(r["fonts"]["misses"] for r in renders)
+    print(f"Font cache: {hits} hits, {misses} misses ({hits / max(hits + misses, 1):.0%} hit rate)")
+    print_encode_totals(renders, args.format, args.compress_level)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,135 @@
+import os
+import gc
+import json
+import time
+import platform
+import tracemalloc
+from datetime import datetime
+import numpy as np
+from PIL import Image
+
+from test_doc_navit import DOCS, DOC_DIR
+from processor_backends import load_backend, image_processor_of
+from process_memory import peak_rss_bytes
+
+SCHEMA_VERSION = 2
+BENCH_FILE = "document_navit_benchmark.json"
+
+
+def latency_stats(samples_ms):
+    arr = np.asarray(samples_ms, dtype=np.float64)
+    p50, p95, p99 = np.percentile(arr, (50, 95, 99))
+    return {"mean": round(float(arr.mean()), 3), "p50": round(float(p50), 3),
+            "p95": round(float(p95), 3), "p99": round(float(p99), 3)}
+
+
+def bench_document(processor, img, warmup, trials):
+    for _ in range(warmup):
+        processor(images=img, return_tensors="np")
+
+    samples = []
+    for _ in range(trials):
+        t0 = time.perf_counter()
+        inputs = processor(images=img, return_tensors="np")
+        samples.append((time.perf_counter() - t0) * 1000)
+
+    # One extra traced call: tracemalloc slows things down, so keep it out of the timings
+    tracemalloc.start()
+    processor(images=img, return_tensors="np")
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    t, h_p, w_p = (int(v) for v in np.asarray(inputs["image_grid_thw"])[0])
+    return samples, traced_peak, f"{h_p}x{w_p}"
+
+
+def bench_processor(name, warmup=2, trials=10):
+    """Benchmark one processor over every DOCS entry; falls back to the local stand-in offline"""
+    t0 = time.perf_counter()
+    backend = name
+    try:
+        processor = load_backend(name)
+    except Exception as e:
+        backend = f"reference-{name}"
+        print(f"  ⚠️ {name} unavailable ({str(e)[:60]}), using {backend}")
+        processor = load_backend(backend)
+    processor = image_processor_of(processor)
+    load_s = time.perf_counter() - t0
+
+    print(f"\n{name} [{type(processor).__name__}] loaded in {load_s:.2f}s")
+    print(f"  {'Document':<26} {'Grid':>9} {'img/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'Alloc/img':>11}")
+    print("  " + "-"*86)
+
+    documents = []
+    all_samples = []
+    for cfg in DOCS:
+        img = Image.open(os.path.join(DOC_DIR, f"{cfg['id']}.png"))
+        img.load()
+        samples, alloc, grid = bench_document(processor, img, warmup, trials)
+        stats = latency_stats(samples)
+        all_samples.extend(samples)
+        documents.append({
+            "id": cfg["id"],
+            "width": cfg["width"],
+            "height": cfg["height"],
+            "grid": grid,
+            "images_per_sec": round(1000 / stats["mean"], 2),
+            "latency_ms": stats,
+            "traced_alloc_bytes_per_image": alloc,
+        })
+        print(f"  {cfg['id']:<26} {grid:>9} {1000 / stats['mean']:>8.1f} {stats['p50']:>7.1f}ms "
+              f"{stats['p95']:>7.1f}ms {stats['p99']:>7.1f}ms {alloc / 2**20:>8.1f}MiB")
+        del img
+        gc.collect()
+
+    overall = latency_stats(all_samples)
+    summary = {
+        "backend": backend,
+        "processor_class": type(processor).__name__,
+        "load_seconds": round(load_s, 3),
+        "images_per_sec": round(len(all_samples) / (sum(all_samples) / 1000), 2),
+        "latency_ms": overall,
+        # Peak of the subprocess that loaded and ran only this processor (interpreter included)
+        "subprocess_peak_rss_bytes": peak_rss_bytes(),
+        "documents": documents,
+    }
+    peak = summary["subprocess_peak_rss_bytes"]
+    print(f"  → {summary['images_per_sec']:.1f} img/s, p50 {overall['p50']:.1f}ms, p99 {overall['p99']:.1f}ms"
+          + (f", peak RSS {peak / 2**20:,.0f}MiB" if peak else ""), flush=True)
+
+    del processor
+    gc.collect()
+    return summary
+
+
+def bench_isolated(name, warmup=2, trials=10):
+    """bench_processor in a freshly spawned interpreter: ru_maxrss is a process-wide high-water
+    mark, so only a process of its own gives each processor a peak RSS that is its own"""
+    from navit_scheduler import spawn_pool
+    with spawn_pool() as pool:
+        return pool.submit(bench_processor, name, warmup, trials).result()
+
+
+def run_benchmark(processors, warmup=2, trials=10, out=None):
+    print("\n" + "="*70)
+    print(f"PREPROCESSING BENCHMARK — warmup {warmup}, trials {trials}")
+    print("="*70)
+
+    report = {
+        "schema_version": SCHEMA_VERSION,
+        "timestamp": datetime.now().isoformat(),
+        "test_type": "preprocessing_benchmark",
+        "config": {"warmup": warmup, "trials": trials, "documents": [d["id"] for d in DOCS]},
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+        },
+        "processors": {name: bench_isolated(name, warmup, trials) for name in processors},
+    }
+
+    out = out or os.path.join(DOC_DIR, BENCH_FILE)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False, sort_keys=True)
+    print(f"\n Benchmark: {out}")
+    return report
@@ -0,0 +1,448 @@
+import os
+import gc
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+from navit_grid import PROFILES, predict_grid_thw, grid_patches
+from packed_corpus import PackedCorpus
+from processor_backends import load_backend
+
+FIXED_RESIZE_TOKENS = [256, 576, 1024]
+STATUS_ICONS = {"PASS": "✅", "FAIL": "❌", "CHECK": "⚠️", "ERROR": "💥", "N/A": "❓"}
+
+
+def classify(actual, expected):
+    if actual in FIXED_RESIZE_TOKENS and expected not in FIXED_RESIZE_TOKENS:
+        return "FAIL"
+    return "PASS" if actual == expected else "CHECK"
+
+
+_packed = {}
+
+
+def open_page(source, cfg):
+    """cfg's page from source: a directory of <id>.png files, or a packed corpus file
+    (a zero-copy view into its memory map, which the processors take like an image)
+    """
+    if os.path.isdir(source):
+        return Image.open(os.path.join(source, f"{cfg['id']}.png"))
+    if source not in _packed:
+        _packed[source] = PackedCorpus(source)
+    return _packed[source].page(cfg["id"])
+
+
+def expected_patches(docs, profile):
+    """Predicted patch counts for a list of docs, in one vectorized call"""
+    grid = predict_grid_thw([d["width"] for d in docs], [d["height"] for d in docs], profile)
+    return [int(n) for n in grid_patches(grid)]
+
+
+class ModelAdapter:
+    """What the driver needs to know about one model: how to load it, preprocess a
+    list of images, and read the (t, h, w) grid rows back out of the processor output.
+    """
+
+    name = None
+    title = None
+    profile = None
+    default_backend = None
+    # Rough resident footprint while processing the 4K page, for the memory budget
+    est_mem_mb = 1024
+    attributes = ['size', 'image_size', 'min_pixels', 'max_pixels', 'crop_size', 'do_resize']
+
+    def __init__(self, backend=None):
+        self.backend = backend or self.default_backend
+        self.processor = None
+        # Optional preprocess_cache.PreprocessCache consulted by process()
+        self.cache = None
+
+    def load(self):
+        self.processor = load_backend(self.backend)
+        return self.processor
+
+    def unload(self):
+        self.processor = None
+        gc.collect()
+
+    def describe(self):
+        return {attr: getattr(self.processor, attr, 'N/A') for attr in self.attributes}
+
+    def preprocess(self, images):
+        raise NotImplementedError
+
+    def process(self, images):
+        """preprocess(images), through the preprocessing cache when one is attached"""
+        if self.cache is None:
+            return self.preprocess(images)
+        return self.cache.preprocess(self, images)
+
+    def extract_grids(self, inputs):
+        """(t, h, w) per image, or None if the processor doesn't report a grid"""
+        if 'image_grid_thw' not in inputs:
+            return None
+        return [tuple(int(v) for v in row) for row in inputs['image_grid_thw'].tolist()]
+
+    def sequence_lengths(self, inputs):
+        """prompt_lengths.vision_spans() of the tokenized prompts plus their "source", or None
+        for processors without a text path"""
+        return None
+
+
+class GLMAdapter(ModelAdapter):
+    name = "glm"
+    title = "GLM-OCR"
+    profile = "glm"
+    default_backend = "glm"
+    est_mem_mb = 1200
+
+    def preprocess(self, images):
+        return self.processor(images=images, return_tensors="pt")
+
+
+def chat_messages(text, img=None):
+    """One user turn: the page image followed by the text prompt"""
+    return [{"role": "user", "content": [
+        {"type": "image", "image": img},
+        {"type": "text", "text": text}
+    ]}]
+
+
+class QwenAdapter(ModelAdapter):
+    name = "qwen"
+    title = "Qwen2.5-VL"
+    profile = "qwen"
+    default_backend = "qwen"
+    est_mem_mb = 1500
+    attributes = []
+
+    prompt_text = "OCR this document"
+
+    def __init__(self, backend=None):
+        super().__init__(backend)
+        # Optional chat_template_cache.ChatTemplateCache: render the prompt once, splice the image pads
+        self.templates = None
+        # Template used to rebuild prompt lengths for preprocess-cache hits (kept out of templates' stats)
+        self._rebuild = None
+
+    def prompt(self, img):
+        messages = chat_messages(self.prompt_text, img)
+        return self.processor.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+
+    def sequence_lengths(self, inputs):
+        from prompt_lengths import image_token_id, merged_tokens, vision_spans
+        if "input_ids" in inputs:
+            seq = vision_spans(inputs["input_ids"], image_token_id(self.processor), inputs.get("attention_mask"))
+            seq["source"] = "input_ids"
+            return seq
+        if "image_grid_thw" not in inputs:
+            return None
+        # A preprocess-cache hit carries no text: rebuild the ids the template gives for these grids
+        from chat_template_cache import ChatTemplateCache, splice_rows
+        if self._rebuild is None:
+            self._rebuild = ChatTemplateCache()
+        entry = self._rebuild.entry(self.processor, self.prompt_text)
+        ids, mask = splice_rows(entry, merged_tokens(inputs["image_grid_thw"], self.profile), self.processor.tokenizer)
+        seq = vision_spans(ids, entry["pad_id"], mask)
+        seq["source"] = "template"
+        return seq
+
+    def preprocess(self, images):
+        if self.templates is not None:
+            return self.templates.preprocess(self.processor, self.prompt_text, images, return_tensors="pt")
+        return self.processor(text=[self.prompt(img) for img in images], images=images,
+                              return_tensors="pt", padding=True)
+
+
+ADAPTERS = {"glm": GLMAdapter, "qwen": QwenAdapter}
+
+
+def make_adapter(name, backend=None):
+    return ADAPTERS[name](backend)
+
+
+def fill_grid(result, cfg, grid_row, patch_size):
+    t, h_p, w_p = grid_row
+    result["actual_tokens"] = int(h_p * w_p)
+    result["grid"] = f"{h_p}x{w_p}"
+    pad_w = w_p * patch_size - cfg["width"]
+    pad_h = h_p * patch_size - cfg["height"]
+    result["padding"] = f"+{pad_w}w,+{pad_h}h"
+    result["preprocessed_size"] = f"{w_p}x{h_p} grid"
+
+
+def fill_sequence(result, seq, profile):
+    """Prompt and vision-pad lengths of row 0; a measured pad run that doesn't match the grid is a CHECK.
+
+    Lengths rebuilt from a cached grid (source "template") are recorded but not checked:
+    they match the grid by construction.
+    """
+    result["prompt_tokens"] = int(seq["prompt_tokens"][0])
+    result["vision_tokens"] = int(seq["vision_tokens"][0])
+    result["sequence_source"] = seq["source"]
+    merge = PROFILES[profile]["merge_size"]
+    if seq["source"] == "input_ids" and result["actual_tokens"] is not None and result["status"] == "PASS" and (
+            seq["spans"][0] != 1 or result["vision_tokens"] != result["actual_tokens"] // (merge * merge)):
+        result["status"] = "CHECK"
+
+
+def fill_from_pixels(result, inputs, patch_size):
+    """Fallback for processors without image_grid_thw: size of the 4D pixel tensor"""
+    for key in inputs:
+        tensor = inputs[key]
+        if hasattr(tensor, 'shape') and len(tensor.shape) == 4:
+            _, c, h, w = tensor.shape
+            result["actual_tokens"] = (w // patch_size) * (h // patch_size)
+            result["preprocessed_size"] = f"{w}x{h}"
+
+
+def run_batched(adapter, docs, doc_dir, results, batch_size, log=print):
+    """Re-run docs through adapter.preprocess in chunks and split the grids per document.
+
+    Each result gains batched_grid / batched_ms (chunk time amortized per image), and is
+    downgraded to CHECK if batching changes its grid. A chunk that fails to preprocess marks
+    its results CHECK with batched_error and the run moves on to the next chunk.
+    """
+    log(f"\nBatched preprocessing ({batch_size} images per call):")
+    log(f"  {'Document':<26} {'Grid':>12} {'Single':>10} {'Batched':>10}")
+    log("  " + "-"*62)
+
+    for start in range(0, len(docs), batch_size):
+        chunk = docs[start:start + batch_size]
+        imgs = inputs = None
+        try:
+            imgs = [open_page(doc_dir, cfg) for cfg in chunk]
+            t0 = time.perf_counter()
+            inputs = adapter.process(imgs)
+            per_image_ms = (time.perf_counter() - t0) * 1000 / len(chunk)
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)[:80]}"
+            for result in results[start:start + batch_size]:
+                result["batched_error"] = error
+                result["status"] = "CHECK"
+            log(f"  ✗ {len(chunk)} images from {chunk[0]['id']}: {error}")
+            del imgs, inputs
+            gc.collect()
+            continue
+
+        # One (t, h, w) row per image, in submission order
+        rows = adapter.extract_grids(inputs) or []
+        for result, (t, h_p, w_p) in zip(results[start:start + batch_size], rows):
+            result["batched_grid"] = f"{h_p}x{w_p}"
+            result["batched_ms"] = round(per_image_ms, 2)
+            if result.get("grid") and result["grid"] != result["batched_grid"]:
+                result["status"] = "CHECK"
+            single = result.get("preprocess_ms")
+            single_str = f"{single:.1f}ms" if single is not None else "-"
+            log(f"  {result['id']:<26} {result['batched_grid']:>12} {single_str:>10} {per_image_ms:>8.1f}ms")
+
+        del imgs, inputs
+        gc.collect()
+
+    timed = [r for r in results if r.get("preprocess_ms") is not None and "batched_ms" in r]
+    single_ms = sum(r["preprocess_ms"] for r in timed) / max(len(timed), 1)
+    batched_ms = sum(r["batched_ms"] for r in timed) / max(len(timed), 1)
+    log(f"\n  Per image: {single_ms:.1f}ms single vs {batched_ms:.1f}ms batched "
+        f"→ {single_ms - batched_ms:+.1f}ms saved ({(1 - batched_ms / single_ms) if single_ms else 0:.0%})")
+    failed = sum("batched_error" in r for r in results)
+    if failed:
+        log(f"  ⚠️ {failed} images left out: their batch failed to preprocess")
+
+
+def run_model(adapter, docs, doc_dir, batch_size=0, log=print, on_result=None, on_done=None, skip=None):
+    """Load one model, verify every doc against the predicted grid and return per-doc results.
+
+    on_result(model_name, result) is called as soon as each document is verified and
+    on_done(model_name, results) once batching is done too. Documents for which
+    skip(model_name, doc_id) is true (already recorded by a resumed run) are left out.
+    """
+    if skip:
+        docs = [d for d in docs if not skip(adapter.name, d["id"])]
+        if not docs:
+            log(f"\n{adapter.title}: nothing left to run")
+            return []
+
+    log("\n" + "="*70)
+    log(f"{adapter.title} — Document NaViT Test")
+    log("="*70 + "\n")
+
+    log(f"Loading {adapter.title} processor ({adapter.backend})...")
+    adapter.load()
+    log(f"✓ Loaded: {type(adapter.processor).__name__}")
+
+    attrs = adapter.describe()
+    if attrs:
+        log("\nProcessor attributes:")
+        for attr, val in attrs.items():
+            log(f"  {attr}: {val}")
+
+    patch_size = PROFILES[adapter.profile]["patch_size"]
+    results = []
+    log(f"\n{'Document':<28} {'Dims':<14} {'Expected':>8} {'Actual':>8} {'Grid':>12} {'Padding':>14} {'Status'}")
+    log("-"*90)
+
+    for cfg, expected in zip(docs, expected_patches(docs, adapter.profile)):
+        img = open_page(doc_dir, cfg)
+
+        result = {
+            "id": cfg["id"], "desc": cfg["desc"],
+            "dimensions": f"{cfg['width']}x{cfg['height']}",
+            "expected_tokens": expected,
+            "actual_tokens": None,
+            "grid": None,
+            "padding": None,
+            "preprocessed_size": None,
+            "status": "pending"
+        }
+
+        try:
+            t0 = time.perf_counter()
+            inputs = adapter.process([img])
+            result["preprocess_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+
+            grids = adapter.extract_grids(inputs)
+            if grids:
+                fill_grid(result, cfg, grids[0], patch_size)
+            else:
+                fill_from_pixels(result, inputs, patch_size)
+
+            if result["actual_tokens"] is not None:
+                result["status"] = classify(result["actual_tokens"], expected)
+            else:
+                result["status"] = "N/A"
+                result["keys"] = list(inputs.keys())
+
+            seq = adapter.sequence_lengths(inputs)
+            if seq is not None:
+                fill_sequence(result, seq, adapter.profile)
+        except Exception as e:
+            result["status"] = "ERROR"
+            result["error"] = str(e)[:80]
+
+        results.append(result)
+        if on_result:
+            on_result(adapter.name, result)
+        icon = STATUS_ICONS[result["status"]]
+        act_str = str(result.get("actual_tokens") or "N/A")
+        grid_str = result.get("grid") or "-"
+        pad_str = result.get("padding") or "-"
+        log(f"  {cfg['id']:<26} {cfg['width']}x{cfg['height']:<8} {expected:>8,} {act_str:>8} {grid_str:>12} {pad_str:>14} {icon}")
+
+        del img
+        gc.collect()
+
+    if batch_size:
+        run_batched(adapter, docs, doc_dir, results, batch_size, log)
+
+    passes = sum(1 for r in results if r["status"] == "PASS")
+    log(f"\n{adapter.title}: {passes}/{len(results)} PASS")
+    prompts = [r["prompt_tokens"] for r in results if "prompt_tokens" in r]
+    if prompts:
+        vision = sum(r["vision_tokens"] for r in results if "vision_tokens" in r)
+        log(f"Prompt lengths: {sum(prompts):,} tokens ({vision:,} image pads) over {len(prompts)} documents, "
+            f"longest {max(prompts):,}")
+        rebuilt = sum(1 for r in results if r.get("sequence_source") == "template")
+        if rebuilt:
+            log(f"  ⚠️ {rebuilt} of them rebuilt from cached grids, not measured from input_ids")
+    if adapter.cache is not None:
+        log(adapter.cache.summary())
+    if getattr(adapter, "templates", None) is not None:
+        log(adapter.templates.summary())
+
+    adapter.unload()
+    if on_done:
+        on_done(adapter.name, results)
+    return results
+
+
+class MemoryBudget:
+    """Blocks acquire(mb) until the reservation fits under budget_mb (None = unlimited).
+
+    A single reservation larger than the whole budget is admitted once nothing else
+    is running, so an undersized budget degrades to sequential instead of deadlocking.
+    """
+
+    def __init__(self, budget_mb=None):
+        self.budget_mb = budget_mb
+        self.in_use_mb = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, mb):
+        with self._cond:
+            while (self.budget_mb is not None and self.in_use_mb > 0
+                   and self.in_use_mb + mb > self.budget_mb):
+                self._cond.wait()
+            self.in_use_mb += mb
+
+    def release(self, mb):
+        with self._cond:
+            self.in_use_mb -= mb
+            self._cond.notify_all()
+
+
+def run_models(adapters, docs, doc_dir, batch_size=0, concurrent=False, mem_budget_mb=None,
+               on_result=None, on_done=None, skip=None):
+    """Run several adapters, sequentially or in threads under a memory budget.
+
+    Returns {adapter.name: results}. Concurrent runs buffer each model's table and
+    print it whole when the model finishes, so output never interleaves.
+    """
+    if not concurrent or len(adapters) < 2:
+        results = {}
+        for adapter in adapters:
+            results[adapter.name] = run_model(adapter, docs, doc_dir, batch_size,
+                                              on_result=on_result, on_done=on_done, skip=skip)
+            gc.collect()
+        return results
+
+    budget = MemoryBudget(mem_budget_mb)
+    print_lock = threading.Lock()
+    result_lock = threading.Lock()
+
+    def locked(callback):
+        if not callback:
+            return None
+
+        def call(*args):
+            with result_lock:
+                callback(*args)
+        return call
+
+    def run_one(adapter):
+        lines = []
+        budget.acquire(adapter.est_mem_mb)
+        try:
+            return run_model(adapter, docs, doc_dir, batch_size, log=lines.append,
+                             on_result=locked(on_result), on_done=locked(on_done), skip=skip)
+        finally:
+            budget.release(adapter.est_mem_mb)
+            with print_lock:
+                print("\n".join(lines))
+
+    with ThreadPoolExecutor(max_workers=len(adapters)) as pool:
+        futures = [(a.name, pool.submit(run_one, a)) for a in adapters]
+        return {name: f.result() for name, f in futures}
+
+
+def print_report(results, docs):
+    """One table across every model: actual tokens and status per document"""
+    models = list(results)
+    if not models:
+        return
+    print("\n" + "="*70)
+    print("SUMMARY")
+    print("="*70)
+    print(f"{'Document':<28}" + "".join(f"{m:>16}" for m in models))
+    print("-"*(28 + 16 * len(models)))
+    by_model = {m: {r["id"]: r for r in results[m]} for m in models}
+    for cfg in docs:
+        cells = []
+        for m in models:
+            r = by_model[m].get(cfg["id"])
+            cells.append(f"{str(r.get('actual_tokens') or 'N/A') + ' ' + STATUS_ICONS.get(r['status'], '?'):>16}"
+                         if r else f"{'-':>16}")
+        print(f"  {cfg['id']:<26}" + "".join(cells))
+    print("-"*(28 + 16 * len(models)))
+    print(f"{'PASS':<28}" + "".join(
+        f"{sum(1 for r in results[m] if r['status'] == 'PASS'):>13}/{len(results[m]):<2}" for m in models))
@@ -0,0 +1,116 @@
+import numpy as np
+
+# Preprocessor defaults of the models under test. Both round each side to a
+# multiple of patch_size * merge_size (28) and rescale into [min_pixels, max_pixels].
+# GLM-OCR (Glm4v smart_resize) counts the temporal frames in its pixel budget and
+# upscales images with a side shorter than 28; Qwen2.5-VL does neither.
+PROFILES = {
+    "qwen": {
+        "patch_size": 14,
+        "merge_size": 2,
+        "temporal_patch_size": 2,
+        "min_pixels": 56 * 56,
+        "max_pixels": 28 * 28 * 16384,
+        "budget_includes_frames": False,
+    },
+    "glm": {
+        "patch_size": 14,
+        "merge_size": 2,
+        "temporal_patch_size": 2,
+        "min_pixels": 112 * 112,
+        "max_pixels": 14 * 14 * 2 * 2 * 2 * 6144,
+        "budget_includes_frames": True,
+    },
+}
+
+MAX_ASPECT_RATIO = 200
+
+
+def get_profile(profile="qwen", **overrides):
+    """Return a copy of a named profile (or a profile dict) with overrides applied"""
+    base = PROFILES[profile] if isinstance(profile, str) else profile
+    cfg = dict(base)
+    cfg.update({k: v for k, v in overrides.items() if v is not None})
+    return cfg
+
+
+def smart_resize(widths, heights, profile="qwen", strict=True, **overrides):
+    """Vectorized smart_resize: resized (widths, heights) for arrays of image sizes.
+
+    Mirrors the processors' float math step by step (banker's rounding, floor on
+    downscale, ceil on upscale) so results match them exactly. Images beyond the
+    200:1 aspect limit raise like the processors do, or get a 0x0 size with strict=False.
+    """
+    cfg = get_profile(profile, **overrides)
+    factor = cfg["patch_size"] * cfg["merge_size"]
+    frames = cfg["temporal_patch_size"] if cfg["budget_includes_frames"] else 1
+
+    w = np.asarray(widths, dtype=np.float64).reshape(-1)
+    h = np.asarray(heights, dtype=np.float64).reshape(-1)
+    if w.shape != h.shape:
+        raise ValueError(f"widths and heights differ in length: {w.size} vs {h.size}")
+
+    if cfg["budget_includes_frames"]:
+        # Glm4v scales tiny images up until the short side reaches one merged patch
+        small = (h < factor) | (w < factor)
+        if small.any():
+            scale = np.maximum(factor / h, factor / w)
+            h = np.where(small, np.floor(h * scale), h)
+            w = np.where(small, np.floor(w * scale), w)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.maximum(h, w) / np.minimum(h, w)
+    bad = ~(ratio <= MAX_ASPECT_RATIO)
+    if bad.any():
+        if strict:
+            i = int(np.flatnonzero(bad)[0])
+            raise ValueError(f"absolute aspect ratio must be smaller than {MAX_ASPECT_RATIO}, "
+                             f"got {w[i]:g}x{h[i]:g} at index {i}")
+        h = np.where(bad, factor, h)
+        w = np.where(bad, factor, w)
+
+    h_bar = np.round(h / factor) * factor
+    w_bar = np.round(w / factor) * factor
+    area = frames * h_bar * w_bar
+
+    too_big = area > cfg["max_pixels"]
+    too_small = ~too_big & (area < cfg["min_pixels"])
+
+    if too_big.any():
+        beta = np.sqrt(frames * h * w / cfg["max_pixels"])
+        h_bar = np.where(too_big, np.maximum(factor, np.floor(h / beta / factor) * factor), h_bar)
+        w_bar = np.where(too_big, np.maximum(factor, np.floor(w / beta / factor) * factor), w_bar)
+    if too_small.any():
+        beta = np.sqrt(cfg["min_pixels"] / (frames * h * w))
+        h_bar = np.where(too_small, np.ceil(h * beta / factor) * factor, h_bar)
+        w_bar = np.where(too_small, np.ceil(w * beta / factor) * factor, w_bar)
+
+    h_bar = h_bar.astype(np.int64)
+    w_bar = w_bar.astype(np.int64)
+    if bad.any():
+        h_bar[bad] = 0
+        w_bar[bad] = 0
+    return w_bar, h_bar
+
+
+def predict_grid_thw(widths, heights, profile="qwen", strict=True, **overrides):
+    """Predict image_grid_thw rows (t, h, w) in patches for arrays of image sizes"""
+    cfg = get_profile(profile, **overrides)
+    w_bar, h_bar = smart_resize(widths, heights, cfg, strict=strict)
+    p = cfg["patch_size"]
+    grid = np.empty((w_bar.size, 3), dtype=np.int64)
+    grid[:, 0] = (w_bar > 0).astype(np.int64)
+    grid[:, 1] = h_bar // p
+    grid[:, 2] = w_bar // p
+    return grid
+
+
+def grid_patches(grid):
+    """Patch count per image_grid_thw row (what the harness reports as actual_tokens)"""
+    grid = np.asarray(grid, dtype=np.int64).reshape(-1, 3)
+    return grid[:, 0] * grid[:, 1] * grid[:, 2]
+
+
+def grid_llm_tokens(grid, merge_size=2):
+    """Visual tokens the language model sees per row, after the spatial patch merge"""
+    return grid_patches(grid) // (merge_size * merge_size)
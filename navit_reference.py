@@ -0,0 +1,201 @@
+import re
+import numpy as np
+from PIL import Image
+
+from navit_grid import get_profile, smart_resize
+
+# OpenAI CLIP normalization, shared by the Qwen2-VL and Glm4v image processors
+IMAGE_MEAN = np.array([0.48145466, 0.4578275, 0.40821073], dtype=np.float32)
+IMAGE_STD = np.array([0.26862954, 0.26130258, 0.27577711], dtype=np.float32)
+
+
+class ProcessorOutput(dict):
+    """Minimal BatchFeature stand-in: a dict of arrays"""
+
+
+def as_tensors(out, return_tensors):
+    """Convert arrays to torch tensors for return_tensors="pt" when torch is installed"""
+    if return_tensors != "pt":
+        return out
+    try:
+        import torch
+    except ImportError:
+        return out
+    return ProcessorOutput({k: torch.from_numpy(v) if isinstance(v, np.ndarray) else v for k, v in out.items()})
+
+
+def to_rgb_array(image):
+    """HWC uint8 RGB array from a PIL image or an HWC array (views are passed through)"""
+    if isinstance(image, Image.Image):
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        return np.asarray(image)
+    arr = np.asarray(image)
+    if arr.ndim == 2:
+        arr = np.repeat(arr[:, :, None], 3, axis=2)
+    return arr[:, :, :3]
+
+
+def patchify(pixels, patch_size, merge_size, temporal_patch_size):
+    """Flatten a normalized CHW image into NaViT patches, in the processors' patch order.
+
+    A still image is repeated across the temporal patch, and patches are grouped
+    merge_size x merge_size so the vision tower can merge neighbours.
+    """
+    c, h, w = pixels.shape
+    gh, gw = h // patch_size, w // patch_size
+    frames = np.broadcast_to(pixels[None], (temporal_patch_size, c, h, w))
+    patches = frames.reshape(1, temporal_patch_size, c,
+                             gh // merge_size, merge_size, patch_size,
+                             gw // merge_size, merge_size, patch_size)
+    patches = patches.transpose(0, 3, 6, 4, 7, 2, 1, 5, 8)
+    return patches.reshape(gh * gw, c * temporal_patch_size * patch_size * patch_size)
+
+
+class ReferenceImageProcessor:
+    """Pure NumPy NaViT image processor: smart_resize, rescale, normalize, patchify.
+
+    Emits pixel_values and image_grid_thw like the Qwen2-VL / Glm4v image processors,
+    for running the harness offline without the hub models.
+    """
+
+    def __init__(self, profile="qwen", **overrides):
+        self.profile = profile
+        cfg = get_profile(profile, **overrides)
+        self.patch_size = cfg["patch_size"]
+        self.merge_size = cfg["merge_size"]
+        self.temporal_patch_size = cfg["temporal_patch_size"]
+        self.min_pixels = cfg["min_pixels"]
+        self.max_pixels = cfg["max_pixels"]
+        self.do_resize = True
+        self._cfg = cfg
+
+    def __call__(self, images, return_tensors=None, **kwargs):
+        if not isinstance(images, (list, tuple)):
+            images = [images]
+        arrays = [to_rgb_array(img) for img in images]
+        # Budgets are read at call time so setting min_pixels/max_pixels works like on the HF processors
+        widths, heights = smart_resize([a.shape[1] for a in arrays], [a.shape[0] for a in arrays], self._cfg,
+                                       min_pixels=self.min_pixels, max_pixels=self.max_pixels)
+
+        pixel_values = []
+        grids = np.empty((len(arrays), 3), dtype=np.int64)
+        for i, (arr, w, h) in enumerate(zip(arrays, widths, heights)):
+            if arr.shape[:2] != (h, w):
+                arr = np.asarray(Image.fromarray(np.ascontiguousarray(arr)).resize((int(w), int(h)), Image.BICUBIC))
+            pixels = arr.astype(np.float32)
+            pixels *= 1 / 255
+            pixels -= IMAGE_MEAN
+            pixels /= IMAGE_STD
+            pixel_values.append(patchify(pixels.transpose(2, 0, 1), self.patch_size,
+                                         self.merge_size, self.temporal_patch_size))
+            grids[i] = (1, h // self.patch_size, w // self.patch_size)
+
+        out = ProcessorOutput(pixel_values=np.concatenate(pixel_values), image_grid_thw=grids)
+        return as_tensors(out, return_tensors)
+
+
+# Special token ids of the Qwen2.5-VL tokenizer, so input_ids look like the real thing
+SPECIAL_TOKENS = {
+    "<|endoftext|>": 151643,
+    "<|im_start|>": 151644,
+    "<|im_end|>": 151645,
+    "<|vision_start|>": 151652,
+    "<|vision_end|>": 151653,
+    "<|image_pad|>": 151655,
+}
+PAD_TOKEN = "<|endoftext|>"
+IMAGE_TOKEN = "<|image_pad|>"
+SYSTEM_PROMPT = "You are a helpful assistant."
+_SPECIAL_RE = re.compile("(" + "|".join(re.escape(t) for t in SPECIAL_TOKENS) + ")")
+
+
+class ReferenceTokenizer:
+    """Byte-level stand-in tokenizer: special tokens keep their Qwen ids, other text maps to UTF-8 bytes"""
+
+    pad_token = PAD_TOKEN
+    pad_token_id = SPECIAL_TOKENS[PAD_TOKEN]
+    image_token_id = SPECIAL_TOKENS[IMAGE_TOKEN]
+
+    def encode(self, text):
+        ids = []
+        for piece in _SPECIAL_RE.split(text):
+            if piece in SPECIAL_TOKENS:
+                ids.append(SPECIAL_TOKENS[piece])
+            elif piece:
+                ids.extend(piece.encode("utf-8"))
+        return np.array(ids, dtype=np.int64)
+
+    def convert_tokens_to_ids(self, token):
+        return SPECIAL_TOKENS[token]
+
+
+class ReferenceProcessor:
+    """Qwen2.5-VL-style processor stand-in: chat template, image-pad expansion, tokenization.
+
+    Each <|image_pad|> in the text is expanded to one token per merged patch of the
+    matching image, exactly like Qwen2_5_VLProcessor.
+    """
+
+    image_token = IMAGE_TOKEN
+    chat_template = "reference-qwen2-vl"
+
+    def __init__(self, profile="qwen", **overrides):
+        self.image_processor = ReferenceImageProcessor(profile, **overrides)
+        self.tokenizer = ReferenceTokenizer()
+
+    def apply_chat_template(self, messages, tokenize=False, add_generation_prompt=False):
+        parts = []
+        if not messages or messages[0]["role"] != "system":
+            parts.append(f"<|im_start|>system\n{SYSTEM_PROMPT}<|im_end|>\n")
+        for msg in messages:
+            content = msg["content"]
+            if isinstance(content, str):
+                content = [{"type": "text", "text": content}]
+            body = "".join(f"<|vision_start|>{IMAGE_TOKEN}<|vision_end|>" if c["type"] == "image" else c["text"]
+                           for c in content)
+            parts.append(f"<|im_start|>{msg['role']}\n{body}<|im_end|>\n")
+        if add_generation_prompt:
+            parts.append("<|im_start|>assistant\n")
+        text = "".join(parts)
+        return self.tokenizer.encode(text).tolist() if tokenize else text
+
+    def __call__(self, text=None, images=None, return_tensors=None, padding=False, **kwargs):
+        out = ProcessorOutput()
+        image_tokens = []
+        if images is not None:
+            out.update(self.image_processor(images))
+            merge = self.image_processor.merge_size
+            image_tokens = list(np.prod(out["image_grid_thw"], axis=1) // (merge * merge))
+
+        if text is not None:
+            if isinstance(text, str):
+                text = [text]
+            pad_id = self.tokenizer.image_token_id
+            rows = []
+            next_image = 0
+            for t in text:
+                ids = self.tokenizer.encode(t)
+                repeats = np.ones(ids.size, dtype=np.int64)
+                pads = np.flatnonzero(ids == pad_id)
+                if next_image + pads.size > len(image_tokens):
+                    raise ValueError(f"{next_image + pads.size} image tokens in text but {len(image_tokens)} images")
+                repeats[pads] = image_tokens[next_image:next_image + pads.size]
+                next_image += pads.size
+                rows.append(np.repeat(ids, repeats))
+
+            width = max(r.size for r in rows) if padding else None
+            if width is not None or len(rows) == 1:
+                width = width or rows[0].size
+                input_ids = np.full((len(rows), width), self.tokenizer.pad_token_id, dtype=np.int64)
+                attention_mask = np.zeros((len(rows), width), dtype=np.int64)
+                for i, r in enumerate(rows):
+                    input_ids[i, :r.size] = r
+                    attention_mask[i, :r.size] = 1
+                out["input_ids"] = input_ids
+                out["attention_mask"] = attention_mask
+            else:
+                out["input_ids"] = rows
+                out["attention_mask"] = [np.ones_like(r) for r in rows]
+
+        return as_tensors(out, return_tensors)
@@ -0,0 +1,103 @@
+import os
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from navit_driver import make_adapter, open_page, run_models
+from navit_worker import run_isolated
+from process_memory import current_rss_bytes, peak_rss_bytes
+
+FOOTPRINT_FILE = "processor_footprints.json"
+
+
+def current_rss_mb():
+    """Resident set size of this process right now, in MB (None where unavailable)"""
+    rss = current_rss_bytes()
+    return None if rss is None else rss / 2**20
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB"""
+    peak = peak_rss_bytes()
+    return current_rss_mb() if peak is None else peak / 2**20
+
+
+def measure_footprint(name, backend, doc_dir, doc):
+    """Runs in a fresh subprocess: load the processor, preprocess the largest page, report RSS"""
+    baseline = current_rss_mb()
+    adapter = make_adapter(name, backend)
+    adapter.load()
+    loaded = current_rss_mb()
+    adapter.preprocess([open_page(doc_dir, doc)])
+    peak = peak_rss_mb()
+    adapter.unload()
+    return {"baseline_mb": round(baseline, 1), "loaded_mb": round(loaded, 1), "peak_mb": round(peak, 1),
+            "footprint_mb": round(peak - baseline, 1)}
+
+
+def spawn_pool():
+    # spawn, not fork: the child must not inherit the parent's heap
+    return ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+
+
+def measure_footprints(adapters, docs, doc_dir, remeasure=False):
+    """Footprint per adapter, measured in isolated subprocesses and cached per backend next to the pages"""
+    cache_path = os.path.join(doc_dir if os.path.isdir(doc_dir) else os.path.dirname(doc_dir), FOOTPRINT_FILE)
+    cache = {}
+    if os.path.exists(cache_path) and not remeasure:
+        with open(cache_path, encoding="utf-8") as f:
+            cache = json.load(f)
+
+    largest = max(docs, key=lambda d: d["width"] * d["height"])
+    for adapter in adapters:
+        if adapter.backend not in cache:
+            with spawn_pool() as pool:
+                cache[adapter.backend] = pool.submit(measure_footprint, adapter.name, adapter.backend,
+                                                     doc_dir, largest).result()
+        adapter.est_mem_mb = cache[adapter.backend]["footprint_mb"]
+
+    with open(cache_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    return {a.name: cache[a.backend] for a in adapters}
+
+
+def plan_waves(adapters, budget_mb, baseline_mb=0):
+    """Group adapters into waves whose combined footprint fits the budget (first-fit decreasing).
+
+    Models in a wave are co-resident; waves run one after another. A model that
+    alone exceeds the budget still gets a wave of its own.
+    """
+    waves = []
+    for adapter in sorted(adapters, key=lambda a: -a.est_mem_mb):
+        for wave in waves:
+            if baseline_mb + sum(a.est_mem_mb for a in wave) + adapter.est_mem_mb <= budget_mb:
+                wave.append(adapter)
+                break
+        else:
+            waves.append([adapter])
+    return waves
+
+
+def run_scheduled(adapters, docs, doc_dir, budget_mb, batch_size=0, remeasure=False,
+                  on_result=None, on_done=None, skip=None):
+    """Measure footprints, then run everything co-resident if it fits, else wave by wave in subprocesses.
+
+    Returns ({model: results}, {model: error}).
+    """
+    footprints = measure_footprints(adapters, docs, doc_dir, remeasure)
+    baseline = max(f["baseline_mb"] for f in footprints.values())
+
+    print(f"\nMemory budget: {budget_mb:,} MB (interpreter baseline ~{baseline:.0f} MB)")
+    for name, f in footprints.items():
+        print(f"  {name:<8} footprint {f['footprint_mb']:>8,.0f} MB  (peak RSS {f['peak_mb']:,.0f} MB)")
+
+    waves = plan_waves(adapters, budget_mb, baseline)
+    if len(waves) == 1:
+        print(f"→ co-resident: {', '.join(a.name for a in adapters)} in this process")
+        return run_models(adapters, docs, doc_dir, batch_size, concurrent=True,
+                          on_result=on_result, on_done=on_done, skip=skip), {}
+
+    print(f"→ sequential: {len(waves)} isolated subprocesses: "
+          + " | ".join(", ".join(a.name for a in w) for w in waves))
+    results, errors = run_isolated(waves, docs, doc_dir, batch_size, on_result, on_done, skip)
+    return {a.name: results[a.name] for a in adapters}, errors
@@ -0,0 +1,108 @@
+import sys
+import json
+import argparse
+import subprocess
+
+from navit_driver import make_adapter, run_models
+
+
+def emit(stream, event):
+    stream.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+    stream.flush()
+
+
+def worker_main(argv=None):
+    """Worker entry point: the job ({"docs": [...], "skip": {model: [ids]}}) as JSON on stdin,
+    JSON lines on stdout ("result" per document, "done" per model), human-readable tables on stderr.
+    """
+    parser = argparse.ArgumentParser(description="NaViT model worker (JSON lines on stdout)")
+    parser.add_argument("models", nargs="+", help="model[:backend] specs, run co-resident")
+    parser.add_argument("--doc-dir", required=True)
+    parser.add_argument("--batch-size", type=int, default=0)
+    parser.add_argument("--cache-dir", help="preprocessing cache directory")
+    parser.add_argument("--cache-mb", type=float, default=2048)
+    parser.add_argument("--template-cache", action="store_true", help="render the Qwen chat template once")
+    args = parser.parse_args(argv)
+    # Docs and skip ids come over stdin: a large corpus would overflow a single argv string
+    job = json.load(sys.stdin)
+    skip = {m: set(ids) for m, ids in job.get("skip", {}).items()}
+
+    # Keep stdout for the JSON stream; tables and stray prints go to stderr
+    stream = sys.stdout
+    sys.stdout = sys.stderr
+
+    def on_result(name, result):
+        emit(stream, {"event": "result", "model": name, "result": result})
+
+    def on_done(name, results):
+        emit(stream, {"event": "done", "model": name, "results": results})
+
+    adapters = [make_adapter(*spec.split(":", 1)) for spec in args.models]
+    if args.cache_dir:
+        from preprocess_cache import shared_cache
+        for adapter in adapters:
+            adapter.cache = shared_cache(args.cache_dir, args.cache_mb)
+    if args.template_cache:
+        from chat_template_cache import ChatTemplateCache
+        for adapter in adapters:
+            if hasattr(adapter, "templates"):
+                adapter.templates = ChatTemplateCache()
+    run_models(adapters, job["docs"], args.doc_dir, args.batch_size, concurrent=True,
+               on_result=on_result, on_done=on_done, skip=lambda m, doc_id: doc_id in skip.get(m, ()))
+
+
+def run_isolated(groups, docs, doc_dir, batch_size=0, on_result=None, on_done=None, skip=None):
+    """Run each group of adapters in its own worker subprocess, one group after another.
+
+    on_result(model, result) fires for every streamed document and on_done(model, results)
+    once a model finishes (its results then include the batched fields); documents where
+    skip(model, doc_id) is true are not re-run. Returns
+    ({model: results}, {model: error}) — models of a crashed worker keep whatever
+    documents were streamed before the crash.
+    """
+    results, errors = {}, {}
+    for group in groups:
+        cmd = [sys.executable, __file__, *[f"{a.name}:{a.backend}" for a in group],
+               "--doc-dir", doc_dir, "--batch-size", str(batch_size)]
+        cache = next((a.cache for a in group if a.cache is not None), None)
+        if cache:
+            cmd += ["--cache-dir", cache.cache_dir, "--cache-mb", str(cache.max_bytes / 2**20)]
+        if any(getattr(a, "templates", None) is not None for a in group):
+            cmd.append("--template-cache")
+        job = {"docs": docs}
+        if skip:
+            job["skip"] = {a.name: [d["id"] for d in docs if skip(a.name, d["id"])] for a in group}
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, encoding="utf-8")
+        try:
+            # The worker reads the whole job before it writes anything, so this can't deadlock
+            proc.stdin.write(json.dumps(job))
+            proc.stdin.close()
+        except OSError:
+            # Worker died on startup; its exit code is reported below
+            pass
+        done = set()
+        for line in proc.stdout:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            model = event.get("model")
+            if event.get("event") == "result":
+                results.setdefault(model, []).append(event["result"])
+                if on_result:
+                    on_result(model, event["result"])
+            elif event.get("event") == "done":
+                results[model] = event["results"]
+                done.add(model)
+                if on_done:
+                    on_done(model, event["results"])
+        code = proc.wait()
+        for a in group:
+            if a.name not in done:
+                errors[a.name] = f"worker exited with code {code} before finishing"
+                results.setdefault(a.name, [])
+    return results, errors
+
+
+if __name__ == "__main__":
+    worker_main()
@@ -0,0 +1,93 @@
+import os
+import json
+import numpy as np
+
+PACK_VERSION = 1
+# Page offsets are aligned so every page view starts on a cache line
+ALIGN = 64
+
+
+def index_path(path):
+    return os.path.splitext(path)[0] + ".json"
+
+
+class PackedWriter:
+    """Appends RGB pages to one contiguous uint8 file; the (id, offset, width, height, desc)
+    index goes to a JSON file next to it when the writer is closed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pages = []
+        self._f = open(path, "wb")
+        self._offset = 0
+
+    def write(self, doc_id, mode, size, raw, desc=None):
+        """Append one page given as a raw buffer (img.mode, img.size, img.tobytes()); returns its index entry"""
+        if mode != "RGB":
+            raise ValueError(f"packed pages must be RGB, got {mode}")
+        width, height = size
+        if len(raw) != width * height * 3:
+            raise ValueError(f"{doc_id}: {len(raw)} bytes for a {width}x{height} RGB page")
+        pad = -self._offset % ALIGN
+        if pad:
+            self._f.write(b"\0" * pad)
+            self._offset += pad
+        entry = {"id": doc_id, "offset": self._offset, "width": width, "height": height}
+        if desc is not None:
+            entry["desc"] = desc
+        self._f.write(raw)
+        self._offset += len(raw)
+        self.pages.append(entry)
+        return entry
+
+    def write_image(self, doc_id, img, desc=None):
+        img = img.convert("RGB")
+        return self.write(doc_id, img.mode, img.size, img.tobytes(), desc)
+
+    def close(self):
+        self._f.close()
+        index = {"version": PACK_VERSION, "dtype": "uint8", "channels": 3,
+                 "data": os.path.basename(self.path), "size": self._offset, "pages": self.pages}
+        tmp = index_path(self.path) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=1)
+        os.replace(tmp, index_path(self.path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PackedCorpus:
+    """Read side of a packed file: one np.memmap over the data, and each page handed out
+    as a zero-copy (height, width, 3) view into it, so loading is page-cache reads only.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(index_path(path), encoding="utf-8") as f:
+            self.index = json.load(f)
+        if self.index.get("version") != PACK_VERSION:
+            raise ValueError(f"{index_path(path)}: unsupported packed corpus version {self.index.get('version')}")
+        self.pages = self.index["pages"]
+        self._by_id = {p["id"]: p for p in self.pages}
+        self.data = np.memmap(path, dtype=np.uint8, mode="r", shape=(self.index["size"],))
+
+    def __len__(self):
+        return len(self.pages)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._by_id
+
+    def docs(self):
+        """Page metadata in the harness's DOCS shape"""
+        return [{"id": p["id"], "width": p["width"], "height": p["height"], "desc": p.get("desc", p["id"])}
+                for p in self.pages]
+
+    def page(self, doc_id):
+        p = self._by_id[doc_id]
+        n = p["width"] * p["height"] * 3
+        return self.data[p["offset"]:p["offset"] + n].reshape(p["height"], p["width"], 3)
@@ -0,0 +1,252 @@
+import os
+import re
+import json
+import argparse
+import numpy as np
+
+from navit_grid import PROFILES, predict_grid_thw
+from token_planner import load_dimensions
+from sequence_packing import load_manifest
+
+ANALYTICS_FILE = "padding_analytics.json"
+RATIO_BINS = 128
+_PADDING_RE = re.compile(r"^\+?(-?\d+)w,\+?(-?\d+)h$")
+
+
+def parse_padding(text):
+    """(pad_w, pad_h) pixels from a results "padding" string such as "+12w,+0h" or "+-4w,+-4h"
+    (negative: the grid came out smaller than the page)"""
+    m = _PADDING_RE.match(text.strip())
+    if not m:
+        raise ValueError(f"unparseable padding {text!r}")
+    return int(m.group(1)), int(m.group(2))
+
+
+def parse_grid(text):
+    """(h_patches, w_patches) from a results "grid" string such as "154x274" """
+    h, w = text.split("x")
+    return int(h), int(w)
+
+
+def from_results(path, model):
+    """Per-document arrays (ids, width, height, grid_h, grid_w) from a document_navit_results.json.
+
+    The recorded padding strings are cross-checked against dimensions and grid.
+    """
+    with open(path, encoding="utf-8") as f:
+        rows = [r for r in json.load(f)["results"].get(model, []) if r.get("grid")]
+    patch = PROFILES[model]["patch_size"]
+    ids, dims, grids = [], [], []
+    for r in rows:
+        w, h = (int(v) for v in r["dimensions"].split("x"))
+        gh, gw = parse_grid(r["grid"])
+        if r.get("padding") and parse_padding(r["padding"]) != (gw * patch - w, gh * patch - h):
+            raise ValueError(f"{r['id']}: padding {r['padding']} disagrees with {r['dimensions']} / {r['grid']}")
+        ids.append(r["id"])
+        dims.append((w, h))
+        grids.append((gh, gw))
+    dims = np.array(dims, dtype=np.int64).reshape(-1, 2)
+    grids = np.array(grids, dtype=np.int64).reshape(-1, 2)
+    return ids, dims[:, 0], dims[:, 1], grids[:, 0], grids[:, 1]
+
+
+def from_dims(widths, heights, model, ids=None):
+    """The same arrays with grids predicted by navit_grid (pages it rejects are dropped);
+    pages without ids are numbered page_NNNNNN"""
+    w = np.asarray(widths, dtype=np.int64)
+    h = np.asarray(heights, dtype=np.int64)
+    grid = predict_grid_thw(w, h, model, strict=False)
+    ok = grid[:, 0] > 0
+    ids = ids if ids is not None else [f"page_{i:06d}" for i in range(w.size)]
+    return [i for i, k in zip(ids, ok) if k], w[ok], h[ok], grid[ok, 1], grid[ok, 2]
+
+
+def document_waste(width, height, grid_h, grid_w, patch):
+    """Per-document arrays: alignment padding, wasted pixels (grid area beyond the page's own)
+    and the patches those pixels cost"""
+    pad_w = grid_w * patch - width
+    pad_h = grid_h * patch - height
+    wasted_px = np.maximum(grid_h * grid_w * patch * patch - width * height, 0)
+    return {"pad_w": pad_w, "pad_h": pad_h, "wasted_px": wasted_px,
+            "wasted_patches": wasted_px / (patch * patch), "patches": grid_h * grid_w}
+
+
+def canvas_waste(ratios, patches, canvas):
+    """Patches spent padding each image out to a canvas of aspect ratio `canvas` (w/h) at its own size"""
+    return np.where(canvas >= ratios, patches * (canvas / ratios - 1), patches * (ratios / canvas - 1))
+
+
+def optimal_buckets(ratios, patches, k, bins=RATIO_BINS):
+    """Split log aspect ratio into k contiguous buckets, each padded to one canvas ratio, minimizing
+    total canvas padding. Dynamic programming over `bins` quantized log-ratio bins.
+
+    Returns (edges, canvases, padding) with len(edges) == k + 1 (in w/h ratio units).
+    """
+    logr = np.log(ratios)
+    lo, hi = logr.min(), logr.max()
+    edges = np.linspace(lo, hi + 1e-9, bins + 1)
+    which = np.clip(np.searchsorted(edges, logr, side="right") - 1, 0, bins - 1)
+    occupied = np.unique(which)
+    # Candidate canvases: the mean log ratio of each occupied bin
+    cands = np.array([logr[which == b].mean() for b in occupied])
+    # cost[b, c]: padding of bin b's images on canvas c, prefix-summed over b
+    cost = np.zeros((occupied.size, cands.size))
+    for i, b in enumerate(occupied):
+        sel = which == b
+        cost[i] = canvas_waste(ratios[sel][:, None], patches[sel][:, None], np.exp(cands)[None, :]).sum(axis=0)
+    prefix = np.vstack([np.zeros(cands.size), np.cumsum(cost, axis=0)])
+
+    m = occupied.size
+    k = min(k, m)
+    # span[i, j]: best single bucket over occupied bins i..j (canvas chosen among them)
+    span = np.full((m, m), np.inf)
+    span_c = np.zeros((m, m), dtype=np.int64)
+    for i in range(m):
+        for j in range(i, m):
+            seg = prefix[j + 1, i:j + 1] - prefix[i, i:j + 1]
+            c = int(seg.argmin())
+            span[i, j], span_c[i, j] = seg[c], i + c
+
+    best = np.full((k + 1, m + 1), np.inf)
+    cut = np.zeros((k + 1, m + 1), dtype=np.int64)
+    best[0, 0] = 0
+    for b in range(1, k + 1):
+        for j in range(1, m + 1):
+            opts = best[b - 1, :j] + span[np.arange(j), j - 1]
+            cut[b, j] = int(opts.argmin())
+            best[b, j] = opts[cut[b, j]]
+
+    groups, j = [], m
+    for b in range(k, 0, -1):
+        i = cut[b, j]
+        groups.append((i, j - 1))
+        j = i
+    groups.reverse()
+    bucket_edges = [float(np.exp(lo))] + [float(np.exp(edges[occupied[j] + 1])) for _, j in groups[:-1]] \
+        + [float(np.exp(hi))]
+    canvases = [float(np.exp(cands[span_c[i, j]])) for i, j in groups]
+    return bucket_edges, canvases, float(best[k, m])
+
+
+def uniform_buckets(ratios, patches, k):
+    """Baseline: k buckets evenly spaced in log ratio, canvas at each bucket's geometric centre"""
+    logr = np.log(ratios)
+    edges = np.linspace(logr.min(), logr.max() + 1e-9, k + 1)
+    which = np.clip(np.searchsorted(edges, logr, side="right") - 1, 0, k - 1)
+    canvases = np.exp((edges[:-1] + edges[1:]) / 2)
+    return float(canvas_waste(ratios, patches, canvases[which]).sum())
+
+
+def assign(ratios, edges):
+    return np.clip(np.searchsorted(np.array(edges[1:-1]), ratios, side="right"), 0, len(edges) - 2)
+
+
+def analyze(ids, width, height, grid_h, grid_w, model, k=4, max_k=8):
+    patch = PROFILES[model]["patch_size"]
+    waste = document_waste(width, height, grid_h, grid_w, patch)
+    ratios = width / height
+    patches = waste["patches"].astype(np.float64)
+
+    sweep = []
+    for n in range(1, min(max_k, len(ids)) + 1):
+        edges, canvases, pad = optimal_buckets(ratios, patches, n)
+        sweep.append({"buckets": n, "edges": edges, "canvases": canvases,
+                      "padding_patches": round(pad, 1), "padding_fraction": pad / (pad + patches.sum()),
+                      "uniform_padding_patches": round(uniform_buckets(ratios, patches, n), 1)})
+    chosen = sweep[min(k, len(sweep)) - 1]
+    bucket = assign(ratios, chosen["edges"])
+    canvas_pad = canvas_waste(ratios, patches, np.array(chosen["canvases"])[bucket])
+
+    documents = [{"id": i, "width": int(w), "height": int(h), "ratio": round(float(r), 4), "grid": f"{gh}x{gw}",
+                  "pad_w": int(pw), "pad_h": int(ph), "wasted_px": int(px), "wasted_patches": round(float(wp), 2),
+                  "bucket": int(b), "canvas_padding_patches": round(float(cp), 1)}
+                 for i, w, h, r, gh, gw, pw, ph, px, wp, b, cp in
+                 zip(ids, width, height, ratios, grid_h, grid_w, waste["pad_w"], waste["pad_h"],
+                     waste["wasted_px"], waste["wasted_patches"], bucket, canvas_pad)]
+    buckets = []
+    for b, canvas in enumerate(chosen["canvases"]):
+        sel = bucket == b
+        buckets.append({"bucket": b, "ratio_range": [chosen["edges"][b], chosen["edges"][b + 1]],
+                        "canvas_ratio": canvas, "documents": int(sel.sum()),
+                        "patches": int(patches[sel].sum()), "wasted_px": int(waste["wasted_px"][sel].sum()),
+                        "wasted_patches": round(float(waste["wasted_patches"][sel].sum()), 1),
+                        "canvas_padding_patches": round(float(canvas_pad[sel].sum()), 1)})
+    return {
+        "model": model,
+        "documents": documents,
+        "totals": {"documents": len(ids), "patches": int(patches.sum()),
+                   "wasted_px": int(waste["wasted_px"].sum()),
+                   "wasted_patches": round(float(waste["wasted_patches"].sum()), 1)},
+        "bucket_sweep": sweep,
+        "buckets": buckets,
+    }
+
+
+def print_analysis(report, show_docs=True):
+    totals = report["totals"]
+    print("\n" + "="*70)
+    print(f"PADDING ANALYTICS — {report['model']}, {totals['documents']:,} documents, {totals['patches']:,} patches")
+    print("="*70)
+    if show_docs:
+        print(f"\n{'Document':<26} {'Ratio':>7} {'Grid':>9} {'Pad w':>6} {'Pad h':>6} {'Wasted px':>10} {'Patches':>8} {'Bucket':>7}")
+        print("-"*84)
+        for d in sorted(report["documents"], key=lambda d: -d["wasted_px"]):
+            print(f"  {d['id']:<24} {d['ratio']:>7.2f} {d['grid']:>9} {d['pad_w']:>+6} {d['pad_h']:>+6} "
+                  f"{d['wasted_px']:>10,} {d['wasted_patches']:>8.1f} {d['bucket']:>7}")
+        print("-"*84)
+    print(f"Alignment waste: {totals['wasted_px']:,} px = {totals['wasted_patches']:,.1f} patches "
+          f"({totals['wasted_patches'] / max(totals['patches'], 1):.2%} of all patches)")
+
+    print(f"\n{'Buckets':>8} {'Padding':>12} {'Fraction':>9} {'Uniform':>12}  Boundaries (w/h)")
+    print("-"*84)
+    for s in report["bucket_sweep"]:
+        inner = ", ".join(f"{e:.3g}" for e in s["edges"][1:-1]) or "-"
+        print(f"{s['buckets']:>8} {s['padding_patches']:>12,.0f} {s['padding_fraction']:>8.1%} "
+              f"{s['uniform_padding_patches']:>12,.0f}  {inner}")
+
+    print(f"\n{'Bucket':>6} {'Ratio range':>18} {'Canvas':>8} {'Docs':>6} {'Patches':>9} {'Align waste':>12} {'Canvas pad':>11}")
+    print("-"*84)
+    for b in report["buckets"]:
+        lo, hi = b["ratio_range"]
+        print(f"{b['bucket']:>6} {f'{lo:.3g}-{hi:.3g}':>18} {b['canvas_ratio']:>8.3g} {b['documents']:>6,} "
+              f"{b['patches']:>9,} {b['wasted_patches']:>12,.1f} {b['canvas_padding_patches']:>11,.0f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aggregate padding waste and propose aspect-ratio buckets")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--results", metavar="JSON",
+                        help="document_navit_results.json to analyze (default: the one in stress_test_documents)")
+    source.add_argument("--dims", metavar="FILE", help="CSV or Parquet page sizes; grids are predicted")
+    source.add_argument("--manifest", metavar="JSONL", help="corpus manifest; grids are predicted")
+    parser.add_argument("--model", choices=sorted(PROFILES), default="qwen")
+    parser.add_argument("--buckets", type=int, default=4, help="number of aspect-ratio buckets to propose")
+    parser.add_argument("--max-buckets", type=int, default=8, help="largest bucket count in the sweep")
+    parser.add_argument("--json", help=f"report path (default: stress_test_documents/{ANALYTICS_FILE})")
+    args = parser.parse_args(argv)
+
+    from test_doc_navit import DOC_DIR
+    if args.dims or args.manifest:
+        if args.dims:
+            widths, heights = load_dimensions(args.dims)
+            ids = None
+        else:
+            widths, heights, ids = load_manifest(args.manifest, with_ids=True)
+        arrays = from_dims(widths, heights, args.model, ids)
+    else:
+        arrays = from_results(args.results or os.path.join(DOC_DIR, "document_navit_results.json"), args.model)
+    if not arrays[0]:
+        print(f"No {args.model} grids to analyze")
+        return
+
+    report = analyze(*arrays, args.model, args.buckets, args.max_buckets)
+    print_analysis(report, show_docs=len(arrays[0]) <= 50)
+
+    out = args.json or os.path.join(DOC_DIR, ANALYTICS_FILE)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n Report: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import os
+import gc
+import json
+import time
+import argparse
+import numpy as np
+
+from navit_grid import PROFILES, predict_grid_thw, grid_patches
+from navit_driver import open_page
+from processor_backends import load_backend, image_processor_of
+
+SWEEP_FILE = "pixel_budget_sweep.json"
+# Budgets in merged 28x28 patches; the stock Qwen max (12845056) is 16384 of them
+MAX_PIXELS = [28 * 28 * n for n in (256, 512, 1024, 2048, 4096, 8192, 16384)]
+MIN_PIXELS = [3136, 28 * 28 * 64]
+TARGET_SCALE = 0.75
+
+
+def doc_class(width, height):
+    """Coarse document class the budgets are tuned for"""
+    ratio = max(width, height) / min(width, height)
+    if ratio >= 10:
+        return "strip"
+    if width * height < 128 * 128:
+        return "tiny"
+    if width * height >= 2_000_000:
+        return "large"
+    return "page"
+
+
+def set_pixel_budget(processor, min_pixels, max_pixels):
+    """Point an image processor at a new budget (both the attributes and the size dict newer
+    transformers reads them from)"""
+    ip = image_processor_of(processor)
+    ip.min_pixels, ip.max_pixels = min_pixels, max_pixels
+    size = getattr(ip, "size", None)
+    if isinstance(size, dict) and "shortest_edge" in size:
+        ip.size = {**size, "shortest_edge": min_pixels, "longest_edge": max_pixels}
+    return ip
+
+
+def budgets_grid(min_list, max_list):
+    return [(lo, hi) for lo in min_list for hi in max_list if lo <= hi]
+
+
+def predicted_rows(docs, profile, budgets):
+    """Sweep rows from navit_grid alone (no processor, no latency): fast enough for any corpus"""
+    w = np.array([d["width"] for d in docs], dtype=np.int64)
+    h = np.array([d["height"] for d in docs], dtype=np.int64)
+    patch = PROFILES[profile]["patch_size"]
+    merge = PROFILES[profile]["merge_size"]
+    rows = []
+    for lo, hi in budgets:
+        grid = predict_grid_thw(w, h, profile, strict=False, min_pixels=lo, max_pixels=hi)
+        patches = grid_patches(grid)
+        scale = np.sqrt(grid[:, 1] * grid[:, 2] * patch * patch / (w * h))
+        for d, g, n, s in zip(docs, grid, patches, scale):
+            rows.append({"id": d["id"], "class": doc_class(d["width"], d["height"]),
+                         "min_pixels": lo, "max_pixels": hi, "grid": f"{g[1]}x{g[2]}",
+                         "patches": int(n), "tokens": int(n) // (merge * merge), "scale": round(float(s), 4),
+                         # Upscaling adds no detail, so fidelity tops out at native resolution
+                         "effective": round(min(float(s), 1.0), 4)})
+    return rows
+
+
+def load_array(doc_dir, doc):
+    img = open_page(doc_dir, doc)
+    return np.asarray(img.convert("RGB")) if hasattr(img, "convert") else img
+
+
+def measured_rows(processor, docs, doc_dir, profile, budgets, trials=3):
+    """predicted_rows() plus the processor's actual grid and median latency per (budget, document).
+
+    patches/tokens/scale of a measured row come from the grid the processor returned (the
+    prediction stays in grid and predicted_tokens); a call that fails records error on its
+    row instead, which keeps only the prediction.
+    """
+    rows = predicted_rows(docs, profile, budgets)
+    images = {d["id"]: load_array(doc_dir, d) for d in docs}
+    dims = {d["id"]: (d["width"], d["height"]) for d in docs}
+    patch = PROFILES[profile]["patch_size"]
+    merge = PROFILES[profile]["merge_size"]
+    for row in rows:
+        ip = set_pixel_budget(processor, row["min_pixels"], row["max_pixels"])
+        samples = []
+        try:
+            for _ in range(trials):
+                t0 = time.perf_counter()
+                inputs = ip(images=images[row["id"]], return_tensors="np")
+                samples.append((time.perf_counter() - t0) * 1000)
+        except Exception as e:
+            row["error"] = str(e)[:80]
+            continue
+        t, h_p, w_p = (int(v) for v in np.asarray(inputs["image_grid_thw"])[0])
+        width, height = dims[row["id"]]
+        scale = float(np.sqrt(h_p * w_p * patch * patch / (width * height)))
+        row["actual_grid"] = f"{h_p}x{w_p}"
+        row["predicted_tokens"] = row["tokens"]
+        row["patches"] = t * h_p * w_p
+        row["tokens"] = row["patches"] // (merge * merge)
+        row["scale"], row["effective"] = round(scale, 4), round(min(scale, 1.0), 4)
+        row["latency_ms"] = round(float(np.median(samples)), 2)
+        del inputs
+    gc.collect()
+    return rows
+
+
+def pareto_frontier(points):
+    """Points not beaten on both axes: no other point has fewer-or-equal tokens and a higher
+    effective scale. points are dicts with "tokens" and "effective"; sorted by tokens.
+    """
+    frontier, best = [], -1.0
+    for p in sorted(points, key=lambda p: (p["tokens"], -p["effective"])):
+        if p["effective"] > best:
+            frontier.append(p)
+            best = p["effective"]
+    return frontier
+
+
+def corpus_points(rows):
+    """One point per budget for the whole corpus: total tokens vs. the worst document's effective scale"""
+    by_budget = {}
+    for r in rows:
+        by_budget.setdefault((r["min_pixels"], r["max_pixels"]), []).append(r)
+    return [{"min_pixels": lo, "max_pixels": hi, "tokens": sum(r["tokens"] for r in rs),
+             "effective": min(r["effective"] for r in rs),
+             "latency_ms": round(sum(r.get("latency_ms", 0) for r in rs), 2)}
+            for (lo, hi), rs in by_budget.items()]
+
+
+def recommend(rows, target_scale=TARGET_SCALE):
+    """Per document class: the cheapest budget that keeps every document in it at target_scale or
+    better (or, if none does, the budget with the best worst-case scale)"""
+    out = {}
+    for cls in sorted({r["class"] for r in rows}):
+        points = corpus_points([r for r in rows if r["class"] == cls])
+        ok = [p for p in points if p["effective"] >= target_scale]
+        best = (min(ok, key=lambda p: (p["tokens"], p["max_pixels"])) if ok
+                else max(points, key=lambda p: (p["effective"], -p["tokens"])))
+        out[cls] = {**best, "meets_target": bool(ok),
+                    "documents": sorted({r["id"] for r in rows if r["class"] == cls})}
+    return out
+
+
+def print_sweep(rows, frontiers, recommendations, target_scale):
+    print(f"\n{'Document':<26} {'Class':<6} {'max_pixels':>11} {'Grid':>9} {'Tokens':>7} {'Scale':>6} {'Latency':>9}")
+    print("-"*82)
+    for doc_id, points in frontiers.items():
+        for p in points:
+            lat = f"{p['latency_ms']:.1f}ms" if "latency_ms" in p else "-"
+            mismatch = " 💥" if "error" in p else " ⚠️" if p.get("actual_grid", p["grid"]) != p["grid"] else ""
+            print(f"  {doc_id:<24} {p['class']:<6} {p['max_pixels']:>11,} {p.get('actual_grid', p['grid']):>9} {p['tokens']:>7,} "
+                  f"{p['scale']:>6.2f} {lat:>9}{mismatch}")
+    print("-"*82)
+    print("(per document, only Pareto-optimal budgets: no other budget gives more resolution for fewer tokens)")
+
+    print(f"\nPer-class budgets (every document at scale ≥ {target_scale}):")
+    for cls, rec in recommendations.items():
+        icon = "✅" if rec["meets_target"] else "⚠️"
+        print(f"  {icon} {cls:<6} min_pixels {rec['min_pixels']:>9,}  max_pixels {rec['max_pixels']:>11,}  "
+              f"→ {rec['tokens']:>7,} tokens, worst scale {rec['effective']:.2f}  ({len(rec['documents'])} docs)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep min_pixels/max_pixels: tokens vs. effective resolution")
+    parser.add_argument("--model", choices=sorted(PROFILES), default="qwen")
+    parser.add_argument("--backend", help="processor backend to time (default: the model's hub processor)")
+    parser.add_argument("--offline", action="store_true", help="use the reference-<model> backend")
+    parser.add_argument("--predict-only", action="store_true",
+                        help="skip the processor: grids from navit_grid, no latency (any corpus size)")
+    parser.add_argument("--max-pixels", default=",".join(map(str, MAX_PIXELS)))
+    parser.add_argument("--min-pixels", default=",".join(map(str, MIN_PIXELS)))
+    parser.add_argument("--trials", type=int, default=3, help="timed calls per (budget, document); median kept")
+    parser.add_argument("--target-scale", type=float, default=TARGET_SCALE,
+                        help="minimum linear resize factor a class budget must keep (1.0 = native)")
+    parser.add_argument("--packed", metavar="PATH", help="sweep the pages of a packed corpus instead of DOCS")
+    parser.add_argument("--json", help=f"report path (default: stress_test_documents/{SWEEP_FILE})")
+    args = parser.parse_args(argv)
+
+    from test_doc_navit import DOCS, DOC_DIR
+    docs, doc_dir = DOCS, DOC_DIR
+    if args.packed:
+        from packed_corpus import PackedCorpus
+        docs, doc_dir = PackedCorpus(args.packed).docs(), args.packed
+    budgets = budgets_grid([int(v) for v in args.min_pixels.split(",")],
+                           [int(v) for v in args.max_pixels.split(",")])
+
+    print("="*70)
+    print(f"PIXEL BUDGET SWEEP — {args.model}, {len(budgets)} budgets x {len(docs)} documents")
+    print("="*70)
+
+    if args.predict_only:
+        rows, backend = predicted_rows(docs, args.model, budgets), None
+    else:
+        backend = args.backend or (f"reference-{args.model}" if args.offline else args.model)
+        try:
+            processor = load_backend(backend)
+        except Exception as e:
+            print(f"  ⚠️ {backend} unavailable ({str(e)[:60]}), using reference-{args.model}")
+            backend = f"reference-{args.model}"
+            processor = load_backend(backend)
+        rows = measured_rows(processor, docs, doc_dir, args.model, budgets, args.trials)
+
+    by_doc = {}
+    for r in rows:
+        by_doc.setdefault(r["id"], []).append(r)
+    frontiers = {doc_id: pareto_frontier(points) for doc_id, points in by_doc.items()}
+    recommendations = recommend(rows, args.target_scale)
+    print_sweep(rows, frontiers if len(docs) <= 50 else {}, recommendations, args.target_scale)
+
+    corpus = corpus_points(rows)
+    print("\nCorpus frontier (total tokens vs. worst-document scale):")
+    for p in pareto_frontier(corpus):
+        print(f"  min {p['min_pixels']:>9,}  max {p['max_pixels']:>11,}  {p['tokens']:>9,} tokens  scale {p['effective']:.2f}"
+              + (f"  {p['latency_ms']:.0f}ms" if p["latency_ms"] else ""))
+
+    mismatches = [r for r in rows if "actual_grid" in r and r["actual_grid"] != r["grid"]]
+    if mismatches:
+        print(f"\n⚠️ {len(mismatches)} processor grid(s) differ from the navit_grid prediction")
+    failed = [r for r in rows if "error" in r]
+    if failed:
+        print(f"\n💥 {len(failed)} processor call(s) failed, first: {failed[0]['id']} at max_pixels "
+              f"{failed[0]['max_pixels']:,} ({failed[0]['error']})")
+
+    out = args.json or os.path.join(DOC_DIR, SWEEP_FILE)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({"model": args.model, "backend": backend, "target_scale": args.target_scale,
+                   "budgets": budgets, "rows": rows,
+                   "frontiers": {k: [(p["min_pixels"], p["max_pixels"]) for p in v] for k, v in frontiers.items()},
+                   "corpus_frontier": pareto_frontier(corpus), "recommendations": recommendations},
+                  f, indent=2, ensure_ascii=False)
+    print(f"\n Sweep: {out}")
+
+
+if __name__ == "__main__":
+    main()
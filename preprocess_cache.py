@@ -0,0 +1,163 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from PIL import Image
+
+from processor_backends import image_processor_of
+
+CACHE_VERSION = 1
+CACHE_EXT = ".npz"
+DEFAULT_MAX_MB = 2048
+# Image processor settings that change pixel_values or the grid; anything missing counts as None
+CONFIG_ATTRS = ["min_pixels", "max_pixels", "patch_size", "merge_size", "temporal_patch_size", "size",
+                "do_resize", "resample", "do_rescale", "rescale_factor", "do_normalize", "image_mean",
+                "image_std", "do_convert_rgb"]
+
+
+def image_digest(img):
+    """Content hash of the decoded pixels, so a PNG and the same page from a packed corpus
+    (or a re-encoded file) share one entry
+    """
+    arr = np.ascontiguousarray(img.convert("RGB") if isinstance(img, Image.Image) and img.mode != "RGB" else img)
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f"{arr.dtype}:{arr.shape}".encode())
+    h.update(memoryview(arr).cast("B"))
+    return h.hexdigest()
+
+
+def config_digest(processor):
+    """Hash of the processor class and every CONFIG_ATTRS setting of its image processor"""
+    ip = image_processor_of(processor)
+    cfg = {attr: getattr(ip, attr, None) for attr in CONFIG_ATTRS}
+    cfg["class"] = f"{type(ip).__module__}.{type(ip).__qualname__}"
+    cfg["version"] = CACHE_VERSION
+    blob = json.dumps(cfg, sort_keys=True, default=str)
+    return hashlib.blake2b(blob.encode(), digest_size=10).hexdigest()
+
+
+class PreprocessCache:
+    """On-disk cache of pixel_values / image_grid_thw per (image content, processor config).
+
+    One .npz per image in cache_dir, evicted least-recently-used once the directory
+    grows past max_mb. Recency is the file's mtime, refreshed on every hit, so it
+    survives across runs.
+    """
+
+    def __init__(self, cache_dir, max_mb=DEFAULT_MAX_MB):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_mb * 2**20)
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "stored_bytes": 0}
+        # Models running in threads share one instance (see shared_cache)
+        self._lock = threading.RLock()
+        os.makedirs(cache_dir, exist_ok=True)
+        entries = []
+        for name in os.listdir(cache_dir):
+            if name.endswith(CACHE_EXT):
+                st = os.stat(os.path.join(cache_dir, name))
+                entries.append((st.st_mtime, name[:-len(CACHE_EXT)], st.st_size))
+        self._lru = OrderedDict((key, size) for _, key, size in sorted(entries))
+        self._evict()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_EXT)
+
+    def key(self, img, processor):
+        # Digest the config on every call: a processor's pixel budget may change between lookups
+        return f"{config_digest(processor)}-{image_digest(img)}"
+
+    def get(self, key):
+        """(pixel_values, grid_row) for key, or None"""
+        with self._lock:
+            if key not in self._lru:
+                return None
+            try:
+                with np.load(self._path(key)) as data:
+                    entry = data["pixel_values"], data["image_grid_thw"]
+                os.utime(self._path(key))
+            except (OSError, ValueError, KeyError):
+                del self._lru[key]
+                return None
+            self._lru.move_to_end(key)
+            return entry
+
+    def put(self, key, pixel_values, grid_row):
+        path = self._path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, pixel_values=pixel_values, image_grid_thw=grid_row)
+        os.replace(tmp, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            self._lru[key] = size
+            self._lru.move_to_end(key)
+            self.stats["stored_bytes"] += size
+            self._evict()
+
+    def _evict(self):
+        total = sum(self._lru.values())
+        while total > self.max_bytes and len(self._lru) > 1:
+            key, size = self._lru.popitem(last=False)
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            total -= size
+            self.stats["evictions"] += 1
+
+    def size_bytes(self):
+        with self._lock:
+            return sum(self._lru.values())
+
+    def preprocess(self, adapter, images):
+        """adapter.preprocess(images), served from the cache when every image hits.
+
+        A hit returns only pixel_values and image_grid_thw (numpy); a miss runs the
+        processor and stores each image's slice of its output.
+        """
+        keys = [self.key(img, adapter.processor) for img in images]
+        entries = [self.get(k) for k in keys]
+        if all(e is not None for e in entries):
+            with self._lock:
+                self.stats["hits"] += len(images)
+            return {"pixel_values": np.concatenate([pv for pv, _ in entries]),
+                    "image_grid_thw": np.stack([g for _, g in entries])}
+
+        # A partial hit still runs the processor on the whole batch, so it saves nothing
+        with self._lock:
+            self.stats["misses"] += len(images)
+        inputs = adapter.preprocess(images)
+        if "pixel_values" not in inputs or "image_grid_thw" not in inputs:
+            return inputs
+        pixel_values = np.asarray(inputs["pixel_values"])
+        grids = np.asarray(inputs["image_grid_thw"])
+        # pixel_values holds t*h*w patch rows per image, images back to back
+        bounds = np.concatenate([[0], np.cumsum(np.prod(grids, axis=1))])
+        for key, entry, row, start, end in zip(keys, entries, grids, bounds[:-1], bounds[1:]):
+            if entry is None:
+                self.put(key, pixel_values[start:end], row)
+        return inputs
+
+    def summary(self):
+        looked_up = self.stats["hits"] + self.stats["misses"]
+        return (f"Preprocess cache: {self.stats['hits']} hits, {self.stats['misses']} misses "
+                f"({self.stats['hits'] / max(looked_up, 1):.0%} hit rate), {self.stats['evictions']} evictions, "
+                f"{self.stats['stored_bytes'] / 2**20:,.0f} MB written, "
+                f"{self.size_bytes() / 2**20:,.0f}/{self.max_bytes / 2**20:,.0f} MB in {self.cache_dir}")
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_cache(cache_dir, max_mb=DEFAULT_MAX_MB):
+    """One PreprocessCache per directory in this process, so every model using the directory
+    counts against the same max_mb (separate instances would each enforce it on their own view)
+    """
+    key = os.path.realpath(cache_dir)
+    with _shared_lock:
+        if key not in _shared:
+            _shared[key] = PreprocessCache(cache_dir, max_mb)
+        return _shared[key]
@@ -0,0 +1,52 @@
+from navit_reference import ReferenceImageProcessor, ReferenceProcessor
+
+# name -> loader(); hub backends import transformers lazily so the reference ones load instantly
+BACKENDS = {}
+
+
+def register_backend(name):
+    """Decorator registering a zero-argument processor loader under name"""
+    def decorator(loader):
+        BACKENDS[name] = loader
+        return loader
+    return decorator
+
+
+def available_backends():
+    return sorted(BACKENDS)
+
+
+def load_backend(name):
+    """Instantiate the processor registered as name"""
+    try:
+        loader = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"unknown processor backend {name!r}, choose from {', '.join(available_backends())}")
+    return loader()
+
+
+def image_processor_of(processor):
+    """The image processor inside a full (text + image) processor, or the processor itself"""
+    return getattr(processor, "image_processor", processor)
+
+
+@register_backend("glm")
+def load_glm():
+    from transformers import AutoImageProcessor
+    return AutoImageProcessor.from_pretrained("zai-org/GLM-OCR", trust_remote_code=True)
+
+
+@register_backend("qwen")
+def load_qwen():
+    from transformers import AutoProcessor
+    return AutoProcessor.from_pretrained("Qwen/Qwen2.5-VL-3B-Instruct", trust_remote_code=True)
+
+
+@register_backend("reference-glm")
+def load_reference_glm():
+    return ReferenceImageProcessor("glm")
+
+
+@register_backend("reference-qwen")
+def load_reference_qwen():
+    return ReferenceProcessor("qwen")
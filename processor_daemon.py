@@ -0,0 +1,311 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import socketserver
+import numpy as np
+from PIL import Image
+
+from navit_driver import ADAPTERS, ModelAdapter, make_adapter
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), f"navit-processors-{os.getuid()}.sock")
+
+
+def model_key(name, backend):
+    return f"{name}:{backend or ADAPTERS[name].default_backend}"
+
+
+def image_header(img):
+    """How to ship one image: its file path when it came from disk, otherwise its raw pixels.
+    Returns (header, payload bytes or None).
+    """
+    if isinstance(img, Image.Image):
+        # Only a file Image.open() read as is; np.memmap views also carry a .filename
+        if getattr(img, "filename", None) and os.path.exists(img.filename):
+            return {"path": os.path.abspath(img.filename)}, None
+        raw = img.tobytes()
+        return {"mode": img.mode, "size": list(img.size), "nbytes": len(raw)}, raw
+    arr = np.ascontiguousarray(img, dtype=np.uint8)
+    return {"shape": list(arr.shape), "nbytes": arr.nbytes}, memoryview(arr).cast("B")
+
+
+def read_payloads(headers, stream):
+    """The raw payload (or None for a path) of every image header, read off stream in order"""
+    payloads = []
+    for header in headers:
+        raw = stream.read(header["nbytes"]) if "nbytes" in header else None
+        if raw is not None and len(raw) != header["nbytes"]:
+            raise ConnectionError(f"short image payload: {len(raw)} of {header['nbytes']} bytes")
+        payloads.append(raw)
+    return payloads
+
+
+def decode_image(header, raw):
+    """The image a client described with image_header()"""
+    if "path" in header:
+        return Image.open(header["path"])
+    if "shape" in header:
+        return np.frombuffer(raw, dtype=np.uint8).reshape(header["shape"])
+    return Image.frombytes(header["mode"], tuple(header["size"]), raw)
+
+
+class WarmModel:
+    """One loaded adapter in the daemon. Processors aren't assumed thread-safe, so calls
+    to the same model are serialized; different models run side by side.
+    """
+
+    def __init__(self, name, backend):
+        self.adapter = make_adapter(name, backend)
+        self.lock = threading.Lock()
+        t0 = time.perf_counter()
+        self.adapter.load()
+        self.stats = {"load_ms": round((time.perf_counter() - t0) * 1000, 1), "requests": 0, "images": 0,
+                      "busy_ms": 0.0, "wait_ms": 0.0}
+
+    def process(self, images):
+        t0 = time.perf_counter()
+        with self.lock:
+            t1 = time.perf_counter()
+            inputs = self.adapter.process(images)
+            t2 = time.perf_counter()
+            self.stats["requests"] += 1
+            self.stats["images"] += len(images)
+            self.stats["busy_ms"] += (t2 - t1) * 1000
+            self.stats["wait_ms"] += (t1 - t0) * 1000
+        reply = {"image_grid_thw": self.adapter.extract_grids(inputs),
+                 "preprocess_ms": round((t2 - t1) * 1000, 2), "wait_ms": round((t1 - t0) * 1000, 2)}
+        if "pixel_values" in inputs:
+            reply["pixel_values_shape"] = list(inputs["pixel_values"].shape)
+        return reply
+
+
+class ProcessorDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix-socket server holding warm processors, one thread per client connection.
+
+    Protocol: one JSON request per line, answered by one JSON line. A "process"
+    request lists its images as headers (see image_header); the raw pixel payloads,
+    if any, follow the request line back to back in the same order.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, preload=(), cache_dir=None, cache_mb=2048):
+        self.socket_path = socket_path
+        self.models = {}
+        self.models_lock = threading.Lock()
+        self.cache_dir, self.cache_mb = cache_dir, cache_mb
+        self.started = time.time()
+        super().__init__(socket_path, DaemonHandler)
+        # Local clients only: the socket file is the access control
+        os.chmod(socket_path, 0o600)
+        for name, backend in preload:
+            self.model(name, backend)
+
+    def model(self, name, backend=None):
+        if name not in ADAPTERS:
+            raise ValueError(f"unknown model {name!r}, choose from {', '.join(ADAPTERS)}")
+        key = model_key(name, backend)
+        with self.models_lock:
+            if key not in self.models:
+                print(f"Loading {key}...", file=sys.stderr)
+                warm = WarmModel(name, backend)
+                if self.cache_dir:
+                    from preprocess_cache import shared_cache
+                    warm.adapter.cache = shared_cache(self.cache_dir, self.cache_mb)
+                self.models[key] = warm
+                print(f"✓ {key} warm in {warm.stats['load_ms']:.0f}ms", file=sys.stderr)
+            return self.models[key]
+
+    def status(self):
+        return {"pid": os.getpid(), "socket": self.socket_path, "uptime_s": round(time.time() - self.started, 1),
+                "models": {key: {**m.stats, "busy_ms": round(m.stats["busy_ms"], 1),
+                                 "wait_ms": round(m.stats["wait_ms"], 1)} for key, m in self.models.items()}}
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            try:
+                request = json.loads(line)
+                reply = self.dispatch(request)
+                reply["ok"] = True
+            except Exception as e:
+                reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            self.wfile.write((json.dumps(reply) + "\n").encode())
+            self.wfile.flush()
+            if reply.get("stopping"):
+                # Only once the reply is out: main() removes the socket as soon as serving stops
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+
+    def dispatch(self, request):
+        op = request.get("op")
+        if op == "process":
+            # Read every payload before decoding any, so a bad image can't desync the stream
+            payloads = read_payloads(request["images"], self.rfile)
+            images = [decode_image(h, raw) for h, raw in zip(request["images"], payloads)]
+            return self.server.model(request["model"], request.get("backend")).process(images)
+        if op == "load":
+            warm = self.server.model(request["model"], request.get("backend"))
+            return {"load_ms": warm.stats["load_ms"]}
+        if op == "status":
+            return self.server.status()
+        if op == "stop":
+            return {"stopping": True}
+        raise ValueError(f"unknown op {op!r}")
+
+
+class DaemonClient:
+    """Blocking client for one connection to a running daemon"""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, timeout=None):
+        self.socket_path = socket_path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(socket_path)
+        self._reader = self.sock.makefile("rb")
+
+    def request(self, request, payloads=()):
+        self.sock.sendall((json.dumps(request) + "\n").encode())
+        for payload in payloads:
+            self.sock.sendall(payload)
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError(f"daemon at {self.socket_path} closed the connection")
+        reply = json.loads(line)
+        if not reply.pop("ok"):
+            raise RuntimeError(reply["error"])
+        return reply
+
+    def process(self, model, images, backend=None):
+        headers, payloads = [], []
+        for img in images:
+            header, payload = image_header(img)
+            headers.append(header)
+            if payload is not None:
+                payloads.append(payload)
+        return self.request({"op": "process", "model": model, "backend": backend, "images": headers}, payloads)
+
+    def load(self, model, backend=None):
+        return self.request({"op": "load", "model": model, "backend": backend})
+
+    def status(self):
+        return self.request({"op": "status"})
+
+    def stop(self):
+        return self.request({"op": "stop"})
+
+    def close(self):
+        self._reader.close()
+        self.sock.close()
+
+
+class DaemonAdapter(ModelAdapter):
+    """A model adapter whose processor lives in the daemon: load() only makes sure the
+    daemon has it warm, and preprocess() returns image_grid_thw (no pixel_values).
+    """
+
+    attributes = []
+
+    def __init__(self, name, backend=None, socket_path=DEFAULT_SOCKET):
+        base = ADAPTERS[name]
+        super().__init__(backend or base.default_backend)
+        self.name, self.profile = base.name, base.profile
+        self.title = f"{base.title} (daemon)"
+        self.socket_path = socket_path
+        self.load_ms = None
+
+    def load(self):
+        self.processor = DaemonClient(self.socket_path)
+        self.load_ms = self.processor.load(self.name, self.backend)["load_ms"]
+        return self.processor
+
+    def unload(self):
+        if self.processor is not None:
+            self.processor.close()
+        self.processor = None
+
+    def preprocess(self, images):
+        reply = self.processor.process(self.name, images, self.backend)
+        reply["image_grid_thw"] = np.array(reply["image_grid_thw"] or [], dtype=np.int64).reshape(-1, 3)
+        return reply
+
+
+def remove_stale_socket(path):
+    """Unlink a socket file no daemon is listening on; refuse if one is"""
+    if not os.path.exists(path):
+        return
+    try:
+        DaemonClient(path, timeout=1).close()
+    except OSError:
+        os.remove(path)
+        return
+    raise SystemExit(f"a daemon is already listening on {path}")
+
+
+def print_status(status):
+    print(f"Daemon pid {status['pid']} on {status['socket']}, up {status['uptime_s']:,.0f}s")
+    if not status["models"]:
+        print("  (no processors loaded yet)")
+    for key, st in status["models"].items():
+        per_image = st["busy_ms"] / max(st["images"], 1)
+        print(f"  {key:<24} loaded in {st['load_ms']:>7,.0f}ms  {st['requests']:>6,} requests  "
+              f"{st['images']:>7,} images  {per_image:>7.1f}ms/img  {st['wait_ms']:>8,.0f}ms queued")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep NaViT processors loaded behind a Unix socket")
+    parser.add_argument("command", choices=["serve", "status", "stop"])
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help=f"socket path (default: {DEFAULT_SOCKET})")
+    parser.add_argument("--models", default="glm,qwen",
+                        help="serve: model[:backend] specs to load up front (others load on first request)")
+    parser.add_argument("--offline", action="store_true",
+                        help="serve: preload the reference-glm/reference-qwen backends instead of the hub models")
+    parser.add_argument("--cache-dir", help="serve: also keep a preprocess_cache in this directory")
+    parser.add_argument("--cache-mb", type=float, default=2048)
+    args = parser.parse_args(argv)
+
+    if args.command != "serve":
+        try:
+            client = DaemonClient(args.socket, timeout=10)
+        except OSError as e:
+            raise SystemExit(f"no daemon on {args.socket} ({e})")
+        if args.command == "status":
+            print_status(client.status())
+        else:
+            client.stop()
+            print(f"✓ Stopped daemon on {args.socket}")
+        client.close()
+        return
+
+    preload = []
+    for spec in filter(None, args.models.split(",")):
+        name, _, backend = spec.partition(":")
+        preload.append((name, backend or (f"reference-{name}" if args.offline else None)))
+    remove_stale_socket(args.socket)
+    print("="*70)
+    print(f"NaViT PROCESSOR DAEMON — {args.socket}")
+    print("="*70)
+    server = ProcessorDaemon(args.socket, preload, args.cache_dir, args.cache_mb)
+    print(f"✓ Ready (pid {os.getpid()}); stop with: python processor_daemon.py stop --socket {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        print_status(server.status())
+
+
+if __name__ == "__main__":
+    main()
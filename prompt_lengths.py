@@ -0,0 +1,237 @@
+import os
+import json
+import argparse
+import numpy as np
+
+from navit_grid import PROFILES, predict_grid_thw, grid_patches
+from navit_driver import QwenAdapter, open_page
+
+LENGTHS_FILE = "prompt_lengths.json"
+# Decoder shapes from the models' config.json (num_hidden_layers, num_key_value_heads,
+# hidden_size / num_attention_heads); GLM-OCR is left out until its config is checked
+KV_PRESETS = {
+    "qwen2.5-vl-3b": {"layers": 36, "kv_heads": 2, "head_dim": 128},
+    "qwen2.5-vl-7b": {"layers": 28, "kv_heads": 4, "head_dim": 128},
+}
+DTYPE_BYTES = {"fp32": 4, "bf16": 2, "fp16": 2, "fp8": 1}
+
+
+def image_token_id(processor):
+    return processor.tokenizer.convert_tokens_to_ids(processor.image_token)
+
+
+def as_rows(input_ids, attention_mask=None):
+    """(ids, mask) int64 matrices from a padded batch, or from a ragged list of rows (padded here)"""
+    if isinstance(input_ids, (list, tuple)):
+        rows = [np.asarray(r, dtype=np.int64).reshape(-1) for r in input_ids]
+        width = max((r.size for r in rows), default=0)
+        ids = np.full((len(rows), width), -1, dtype=np.int64)
+        mask = np.zeros((len(rows), width), dtype=np.int64)
+        for i, r in enumerate(rows):
+            ids[i, :r.size] = r
+            mask[i, :r.size] = 1
+        return ids, mask
+    ids = np.asarray(input_ids, dtype=np.int64)
+    if ids.ndim == 1:
+        ids = ids[None]
+    mask = np.ones_like(ids) if attention_mask is None else np.asarray(attention_mask, dtype=np.int64).reshape(ids.shape)
+    return ids, mask
+
+
+def vision_spans(input_ids, image_token_id, attention_mask=None):
+    """Per row of a tokenized batch: prompt length, vision placeholder tokens, text tokens and
+    the runs of consecutive image-pad tokens (one per image), all in array operations.
+
+    Returns a dict of per-row arrays plus span_row / span_start / span_length, one entry
+    per contiguous image-pad run across the batch, in row order.
+    """
+    ids, mask = as_rows(input_ids, attention_mask)
+    is_image = (ids == image_token_id) & (mask > 0)
+    # A zero column on each side, so every run has its +1 start and -1 end edge inside its row
+    edges = np.diff(np.pad(is_image, ((0, 0), (1, 1))).astype(np.int8), axis=1)
+    span_row, span_start = np.nonzero(edges == 1)
+    _, span_end = np.nonzero(edges == -1)
+    prompt = mask.sum(axis=1)
+    vision = is_image.sum(axis=1)
+    return {
+        "prompt_tokens": prompt,
+        "vision_tokens": vision,
+        "text_tokens": prompt - vision,
+        "spans": np.bincount(span_row, minlength=ids.shape[0]),
+        "span_row": span_row,
+        "span_start": span_start,
+        "span_length": span_end - span_start,
+    }
+
+
+def merged_tokens(grids, profile):
+    """Image-pad tokens each (t, h, w) grid row expands to after spatial merging"""
+    merge = PROFILES[profile]["merge_size"]
+    return grid_patches(np.asarray(grids, dtype=np.int64).reshape(-1, 3)) // (merge * merge)
+
+
+def parse_kv(spec):
+    """{name: {layers, kv_heads, head_dim}} from "preset,preset" or "name=layers:kv_heads:head_dim" entries"""
+    configs = {}
+    for item in filter(None, spec.split(",")):
+        if item in KV_PRESETS:
+            configs[item] = KV_PRESETS[item]
+            continue
+        name, _, shape = item.rpartition("=")
+        try:
+            layers, kv_heads, head_dim = (int(v) for v in shape.split(":"))
+        except ValueError:
+            raise ValueError(f"unknown KV config {item!r}: use {', '.join(KV_PRESETS)} or name=layers:kv_heads:head_dim")
+        configs[name or shape] = {"layers": layers, "kv_heads": kv_heads, "head_dim": head_dim}
+    return configs
+
+
+def kv_cache_bytes(tokens, config, dtype_bytes=2):
+    """K and V for every token in every layer: 2 * layers * kv_heads * head_dim * dtype bytes per token"""
+    per_token = 2 * config["layers"] * config["kv_heads"] * config["head_dim"] * dtype_bytes
+    return np.asarray(tokens, dtype=np.int64) * per_token
+
+
+def measure(adapter, docs, doc_dir, batch_size=0):
+    """Tokenize docs through the adapter (in padded chunks of batch_size, 0 = all at once) and
+    return per-document spans alongside the merged token count each grid implies"""
+    image_id = image_token_id(adapter.processor)
+    batch_size = batch_size or len(docs)
+    parts, expected = [], []
+    for start in range(0, len(docs), batch_size):
+        chunk = docs[start:start + batch_size]
+        inputs = adapter.process([open_page(doc_dir, d) for d in chunk])
+        parts.append(vision_spans(inputs["input_ids"], image_id, inputs.get("attention_mask")))
+        expected.append(merged_tokens(inputs["image_grid_thw"], adapter.profile))
+    per_row = ("prompt_tokens", "vision_tokens", "text_tokens", "spans")
+    out = {k: np.concatenate([p[k] for p in parts]) for k in per_row}
+    out["expected_vision_tokens"] = np.concatenate(expected)
+    out["span_length"] = np.concatenate([p["span_length"] for p in parts])
+    return out
+
+
+def predict(widths, heights, text_tokens, profile="qwen"):
+    """Prompt lengths from page sizes alone: the template's text tokens plus each page's merged grid"""
+    grid = predict_grid_thw(widths, heights, profile, strict=False)
+    vision = merged_tokens(grid, profile)
+    return {"vision_tokens": vision, "text_tokens": np.full(vision.size, text_tokens, dtype=np.int64),
+            "prompt_tokens": vision + text_tokens, "valid": grid[:, 0] > 0}
+
+
+def kv_table(prompt_tokens, configs, dtype_bytes):
+    """{config: shape + per_page_mb (array), max_mb, per_layer_mb_max, total_gb} for a vector of prompt lengths"""
+    prompt_tokens = np.asarray(prompt_tokens, dtype=np.int64)
+    table = {}
+    for name, cfg in configs.items():
+        per_page = kv_cache_bytes(prompt_tokens, cfg, dtype_bytes)
+        table[name] = {**cfg, "per_page_mb": per_page / 2**20,
+                       "per_layer_mb_max": float(per_page.max() / cfg["layers"] / 2**20) if per_page.size else 0.0,
+                       "total_gb": float(per_page.sum() / 2**30),
+                       "max_mb": float(per_page.max() / 2**20) if per_page.size else 0.0}
+    return table
+
+
+def print_lengths(ids, lengths, kv, dtype):
+    names = list(kv)
+    print(f"\n{'Document':<26} {'Vision':>8} {'Text':>6} {'Prompt':>8} {'Spans':>6}"
+          + "".join(f"{n[:14] + ' MB':>17}" for n in names))
+    print("-"*(58 + 17 * len(names)))
+    for i, doc_id in enumerate(ids):
+        icon = ""
+        if "expected_vision_tokens" in lengths:
+            ok = lengths["vision_tokens"][i] == lengths["expected_vision_tokens"][i] and lengths["spans"][i] == 1
+            icon = " ✅" if ok else " ⚠️"
+        spans = lengths["spans"][i] if "spans" in lengths else "-"
+        print(f"  {doc_id:<24} {lengths['vision_tokens'][i]:>8,} {lengths['text_tokens'][i]:>6,} "
+              f"{lengths['prompt_tokens'][i]:>8,} {spans:>6}"
+              + "".join(f"{kv[n]['per_page_mb'][i]:>17,.1f}" for n in names) + icon)
+    if ids:
+        print("-"*(58 + 17 * len(names)))
+    prompt = lengths["prompt_tokens"]
+    print(f"  {'Total':<24} {int(lengths['vision_tokens'].sum()):>8,} {int(lengths['text_tokens'].sum()):>6,} "
+          f"{int(prompt.sum()):>8,} {'':>6}" + "".join(f"{kv[n]['total_gb'] * 1024:>17,.1f}" for n in names))
+    p50, p99 = np.percentile(prompt, (50, 99)) if prompt.size else (0, 0)
+    print(f"\nPrompt length p50 {p50:,.0f}, p99 {p99:,.0f}, max {int(prompt.max()) if prompt.size else 0:,} tokens; "
+          f"KV cache in {dtype}:")
+    for name, t in kv.items():
+        print(f"  {name:<16} {t['layers']} layers x {t['kv_heads']} KV heads x {t['head_dim']}: "
+              f"longest page {t['max_mb']:,.1f} MB ({t['per_layer_mb_max'] * 1024:,.0f} KB/layer), "
+              f"all pages {t['total_gb']:,.2f} GB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Vision-token spans, prompt lengths and KV-cache size per page")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--dims", metavar="FILE", help="predict from CSV or Parquet page sizes (width, height columns)")
+    source.add_argument("--manifest", metavar="JSONL", help="predict from a generate_documents.py --variants manifest")
+    source.add_argument("--packed", metavar="PATH", help="tokenize the pages of a packed corpus instead of DOCS")
+    parser.add_argument("--backend", help="Qwen processor backend (default: the hub processor)")
+    parser.add_argument("--offline", action="store_true", help="use the reference-qwen backend")
+    parser.add_argument("--batch-size", type=int, default=0, help="pages per padded processor call (0 = all)")
+    parser.add_argument("--template-cache", action="store_true",
+                        help="tokenize through chat_template_cache (render once, splice image pads)")
+    parser.add_argument("--kv", default=",".join(KV_PRESETS),
+                        help="KV configs: preset names or name=layers:kv_heads:head_dim, comma-separated")
+    parser.add_argument("--kv-dtype", choices=sorted(DTYPE_BYTES), default="bf16")
+    parser.add_argument("--json", help=f"report path (default: stress_test_documents/{LENGTHS_FILE})")
+    args = parser.parse_args(argv)
+
+    from test_doc_navit import DOCS, DOC_DIR
+    configs = parse_kv(args.kv)
+    adapter = QwenAdapter(args.backend or ("reference-qwen" if args.offline else None))
+    adapter.load()
+    if args.template_cache or args.dims or args.manifest:
+        from chat_template_cache import ChatTemplateCache
+        adapter.templates = ChatTemplateCache()
+
+    print("="*70)
+    print(f"PROMPT LENGTHS — {adapter.title} ({adapter.backend}), KV in {args.kv_dtype}")
+    print("="*70)
+
+    if args.dims or args.manifest:
+        from token_planner import load_dimensions
+        from sequence_packing import load_manifest
+        widths, heights = load_dimensions(args.dims) if args.dims else load_manifest(args.manifest)
+        # The rendered template minus its single image placeholder
+        text_tokens = adapter.templates.entry(adapter.processor, adapter.prompt_text)["ids"].size - 1
+        lengths = predict(widths, heights, text_tokens, adapter.profile)
+        if not lengths["valid"].all():
+            print(f"  ⚠️ {int((~lengths['valid']).sum()):,} page(s) smart_resize rejects left out")
+        lengths = {k: v[lengths["valid"]] for k, v in lengths.items() if k != "valid"}
+        ids, source = [], args.dims or args.manifest
+        print(f"{lengths['prompt_tokens'].size:,} pages from {source} (predicted, {text_tokens} text tokens each)")
+    else:
+        docs, doc_dir = DOCS, DOC_DIR
+        if args.packed:
+            from packed_corpus import PackedCorpus
+            docs, doc_dir = PackedCorpus(args.packed).docs(), args.packed
+        lengths = measure(adapter, docs, doc_dir, args.batch_size)
+        ids, source = [d["id"] for d in docs], args.packed or DOC_DIR
+    adapter.unload()
+
+    kv = kv_table(lengths["prompt_tokens"], configs, DTYPE_BYTES[args.kv_dtype])
+    print_lengths(ids if len(ids) <= 200 else [], lengths, kv, args.kv_dtype)
+    if "expected_vision_tokens" in lengths:
+        bad = int(((lengths["vision_tokens"] != lengths["expected_vision_tokens"]) | (lengths["spans"] != 1)).sum())
+        print(f"\n{'✅' if not bad else '⚠️'} image-pad spans match the grids for "
+              f"{len(ids) - bad}/{len(ids)} pages")
+
+    out = args.json or os.path.join(DOC_DIR, LENGTHS_FILE)
+    report = {"backend": adapter.backend, "source": source, "kv_dtype": args.kv_dtype,
+              "kv_configs": {n: {k: v for k, v in t.items() if k != "per_page_mb"} for n, t in kv.items()}}
+    if ids:
+        report["documents"] = [{"id": doc_id, **{k: int(lengths[k][i]) for k in
+                                                ("prompt_tokens", "vision_tokens", "text_tokens", "spans")},
+                                "kv_mb": {n: round(float(kv[n]["per_page_mb"][i]), 3) for n in kv}}
+                               for i, doc_id in enumerate(ids)]
+    else:
+        p = lengths["prompt_tokens"]
+        report["prompt_tokens"] = {"pages": int(p.size), "total": int(p.sum()),
+                                   **{f"p{q}": float(v) for q, v in zip((50, 90, 99), np.percentile(p, (50, 90, 99)))}}
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n Report: {out}")
+
+
+if __name__ == "__main__":
+    main()
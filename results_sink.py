@@ -0,0 +1,94 @@
+import os
+import json
+from datetime import datetime
+
+
+class ResultsSink:
+    """Append-only JSONL log of per-document results: one line per (model, document),
+    flushed as soon as it is written, so a crash loses at most the line in flight.
+
+    A later line for the same (model, id) supersedes earlier ones, which is how batched
+    fields get added after the per-image pass. With resume=True the existing log is
+    kept and done() tells the driver which documents to skip: those whose latest line
+    is not an ERROR, so documents that failed are retried and their new line replaces it.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self._done = set()
+        if resume and os.path.exists(path):
+            self._drop_torn_tail()
+            for model, result in self._read():
+                self._mark(model, result)
+        self._f = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def _drop_torn_tail(self):
+        """Cut a partial last line left by a crash, so appended lines start clean"""
+        with open(self.path, "rb+") as f:
+            size = f.seek(0, os.SEEK_END)
+            pos = size
+            while pos > 0:
+                step = min(pos, 65536)
+                f.seek(pos - step)
+                nl = f.read(step).rfind(b"\n")
+                if nl >= 0:
+                    pos = pos - step + nl + 1
+                    break
+                pos -= step
+            if pos != size:
+                f.truncate(pos)
+
+    def _read(self):
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                yield rec["model"], rec["result"]
+
+    def _mark(self, model, result):
+        if result.get("status") == "ERROR":
+            self._done.discard((model, result["id"]))
+        else:
+            self._done.add((model, result["id"]))
+
+    def done(self, model, doc_id):
+        return (model, doc_id) in self._done
+
+    def write(self, model, result):
+        self._f.write(json.dumps({"model": model, "result": result}, ensure_ascii=False, default=str) + "\n")
+        self._f.flush()
+        self._mark(model, result)
+
+    def close(self):
+        self._f.close()
+
+    def load(self, models, docs):
+        """{model: [result, ...]} from the log, latest line per document, in docs order"""
+        self._f.flush()
+        latest = {}
+        for model, result in self._read():
+            latest[(model, result["id"])] = result
+        return {m: [latest[(m, d["id"])] for d in docs if (m, d["id"]) in latest] for m in models}
+
+    def write_summary(self, out, models, docs, errors=None, backends=None):
+        """Write the classic document_navit_results.json from the log and return its results.
+
+        backends ({model: processor backend}) records which processors produced them.
+        """
+        results = self.load(models, docs)
+        payload = {
+            "timestamp": datetime.now().isoformat(),
+            "test_type": "realistic_documents",
+            "results": results
+        }
+        if backends:
+            payload["backends"] = backends
+        if errors:
+            payload["errors"] = errors
+        tmp = out + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2, ensure_ascii=False, default=str)
+        os.replace(tmp, out)
+        return results
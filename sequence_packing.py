@@ -0,0 +1,223 @@
+import os
+import json
+import bisect
+import argparse
+import numpy as np
+
+from navit_grid import PROFILES, get_profile, predict_grid_thw, grid_patches
+from token_planner import load_dimensions
+
+UNITS = ("patches", "tokens")
+
+
+def to_unit(patches, model, unit):
+    """Vision-encoder patches, or the LLM tokens they merge into (patches / merge_size**2)"""
+    patches = np.asarray(patches, dtype=np.int64)
+    if unit == "patches":
+        return patches
+    merge = PROFILES[model]["merge_size"]
+    return patches // (merge * merge)
+
+
+def lengths_from_results(path, model, unit="patches"):
+    """(ids, lengths) from the grids a test_doc_navit.py run recorded for model"""
+    with open(path, encoding="utf-8") as f:
+        rows = [r for r in json.load(f)["results"].get(model, []) if r.get("grid")]
+    patches = [int(h) * int(w) for h, w in (r["grid"].split("x") for r in rows)]
+    return [r["id"] for r in rows], to_unit(patches, model, unit)
+
+
+def lengths_from_dims(widths, heights, model, unit="patches", **overrides):
+    """Lengths predicted from page sizes; pages smart_resize rejects come out as 0"""
+    grid = predict_grid_thw(widths, heights, get_profile(model, **overrides), strict=False)
+    return to_unit(grid_patches(grid), model, unit)
+
+
+def load_manifest(path, with_ids=False):
+    """(widths, heights) from a corpus manifest.jsonl written by generate_documents.py --variants;
+    with_ids adds the pages' ids as a third element"""
+    widths, heights, ids = [], [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            if not entry.get("error"):
+                widths.append(entry["width"])
+                heights.append(entry["height"])
+                ids.append(entry["id"])
+    widths, heights = np.array(widths, dtype=np.int64), np.array(heights, dtype=np.int64)
+    return (widths, heights, ids) if with_ids else (widths, heights)
+
+
+def first_fit(lengths, max_len):
+    """Bin per sequence: the first open bin with room. A max segment tree over the bins'
+    remaining capacity finds it in O(log n) instead of scanning every bin.
+    """
+    n = len(lengths)
+    size = 1 << max(1, (n - 1).bit_length())
+    tree = [max_len] * (2 * size)
+    bins = np.empty(n, dtype=np.int64)
+    for i, length in enumerate(lengths):
+        node = 1
+        while node < size:
+            node = 2 * node if tree[2 * node] >= length else 2 * node + 1
+        bins[i] = node - size
+        tree[node] -= length
+        node //= 2
+        while node:
+            tree[node] = max(tree[2 * node], tree[2 * node + 1])
+            node //= 2
+    return bins
+
+
+def best_fit(lengths, max_len):
+    """Bin per sequence: the open bin that will be left with the least room (sorted free list)"""
+    free = []
+    bins = np.empty(len(lengths), dtype=np.int64)
+    opened = 0
+    for i, length in enumerate(lengths):
+        j = bisect.bisect_left(free, (length, -1))
+        if j < len(free):
+            room, b = free.pop(j)
+        else:
+            room, b = max_len, opened
+            opened += 1
+        bins[i] = b
+        bisect.insort(free, (room - length, b))
+    return bins
+
+
+def next_fit(lengths, max_len):
+    """Bin per sequence in arrival order, closing the current bin when the next one doesn't fit"""
+    bins = np.empty(len(lengths), dtype=np.int64)
+    b, room = 0, max_len
+    for i, length in enumerate(lengths):
+        if length > room:
+            b, room = b + 1, max_len
+        bins[i] = b
+        room -= length
+    return bins
+
+
+# name -> (sort longest first?, packer)
+STRATEGIES = {
+    "ffd": (True, first_fit),
+    "best-fit": (False, best_fit),
+    "greedy": (False, next_fit),
+}
+
+
+def pack(lengths, max_len, strategy="ffd"):
+    """Assign each sequence to a batch of at most max_len units.
+
+    Returns a bin index per sequence, -1 for sequences that are empty or longer than
+    max_len on their own (they cannot be packed and are reported as oversize).
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    sort, packer = STRATEGIES[strategy]
+    bins = np.full(lengths.size, -1, dtype=np.int64)
+    idx = np.flatnonzero((lengths > 0) & (lengths <= max_len))
+    if sort:
+        idx = idx[np.argsort(-lengths[idx], kind="stable")]
+    if idx.size:
+        bins[idx] = packer(lengths[idx].tolist(), max_len)
+    return bins
+
+
+def packing_stats(lengths, bins, max_len):
+    lengths = np.asarray(lengths, dtype=np.int64)
+    packed = bins >= 0
+    n_bins = int(bins.max()) + 1 if packed.any() else 0
+    loads = np.bincount(bins[packed], weights=lengths[packed], minlength=n_bins)
+    seqs = np.bincount(bins[packed], minlength=n_bins)
+    used = int(lengths[packed].sum())
+    capacity = n_bins * max_len
+    util = loads / max_len if n_bins else np.zeros(1)
+    return {
+        "max_len": max_len,
+        "sequences": int(packed.sum()),
+        "oversize": int(((lengths > max_len)).sum()),
+        "units": used,
+        "batches": n_bins,
+        "lower_bound": -(-used // max_len),
+        "padding_units": capacity - used,
+        "padding_fraction": (capacity - used) / capacity if capacity else 0.0,
+        "utilization_mean": float(util.mean()),
+        "utilization_min": float(util.min()),
+        "utilization_p10": float(np.percentile(util, 10)),
+        "sequences_per_batch": float(seqs.mean()) if n_bins else 0.0,
+        # One sequence per batch, padded to max_len: what not packing would cost
+        "unpacked_padding_fraction": 1 - used / (int(packed.sum()) * max_len) if packed.any() else 0.0,
+    }
+
+
+def simulate(lengths, max_lens, strategies=tuple(STRATEGIES)):
+    """{max_len: {strategy: stats}} for every combination"""
+    return {m: {s: packing_stats(lengths, pack(lengths, m, s), m) for s in strategies} for m in max_lens}
+
+
+def print_simulation(report, title):
+    print("\n" + "="*70)
+    print(f"SEQUENCE PACKING — {title}")
+    print("="*70)
+    for max_len, by_strategy in report.items():
+        first = next(iter(by_strategy.values()))
+        print(f"\nmax_len {max_len:,}: {first['sequences']:,} sequences, {first['units']:,} units, "
+              f"unpacked padding {first['unpacked_padding_fraction']:.1%}")
+        if first["oversize"]:
+            print(f"  ⚠️ {first['oversize']:,} sequence(s) longer than max_len left out")
+        print(f"  {'Strategy':<10} {'Batches':>9} {'Bound':>9} {'Padding':>9} {'Util':>7} {'p10':>7} {'Min':>7} {'Seq/batch':>10}")
+        print("  " + "-"*74)
+        for name, st in by_strategy.items():
+            print(f"  {name:<10} {st['batches']:>9,} {st['lower_bound']:>9,} {st['padding_fraction']:>8.1%} "
+                  f"{st['utilization_mean']:>6.1%} {st['utilization_p10']:>6.1%} {st['utilization_min']:>6.1%} "
+                  f"{st['sequences_per_batch']:>10.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate packing NaViT sequences into fixed-length batches")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--results", metavar="JSON",
+                        help="grids recorded by test_doc_navit.py (default: stress_test_documents/"
+                             "document_navit_results.json if present, else predicted DOCS grids)")
+    source.add_argument("--dims", metavar="FILE", help="CSV or Parquet page sizes (width, height columns)")
+    source.add_argument("--manifest", metavar="JSONL", help="corpus manifest from generate_documents.py --variants")
+    parser.add_argument("--model", choices=sorted(PROFILES), default="qwen")
+    parser.add_argument("--unit", choices=UNITS, default="patches",
+                        help="pack vision-encoder patches (NaViT) or merged LLM tokens")
+    parser.add_argument("--max-len", default="4096,16384,65536",
+                        help="comma-separated batch lengths to simulate")
+    parser.add_argument("--strategy", default="all", choices=["all", *STRATEGIES])
+    parser.add_argument("--json", help="write the report as JSON to this path")
+    args = parser.parse_args(argv)
+
+    if not (args.results or args.dims or args.manifest):
+        from test_doc_navit import DOCS, DOC_DIR
+        default = os.path.join(DOC_DIR, "document_navit_results.json")
+        if os.path.exists(default):
+            args.results = default
+
+    if args.results:
+        _, lengths = lengths_from_results(args.results, args.model, args.unit)
+        source = args.results
+    elif args.dims or args.manifest:
+        widths, heights = load_dimensions(args.dims) if args.dims else load_manifest(args.manifest)
+        lengths = lengths_from_dims(widths, heights, args.model, args.unit)
+        source = args.dims or args.manifest
+    else:
+        lengths = lengths_from_dims([d["width"] for d in DOCS], [d["height"] for d in DOCS], args.model, args.unit)
+        source = "DOCS (predicted)"
+
+    max_lens = [int(m) for m in args.max_len.split(",")]
+    strategies = list(STRATEGIES) if args.strategy == "all" else [args.strategy]
+    report = simulate(lengths, max_lens, strategies)
+    print_simulation(report, f"{args.model} {args.unit} from {source}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"model": args.model, "unit": args.unit, "source": source,
+                       "results": {str(m): r for m, r in report.items()}}, f, indent=2)
+        print(f"\n Report: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
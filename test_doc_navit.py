@@ -1,9 +1,11 @@
 import os
+import re
 import sys
-import gc
-import json
-from datetime import datetime
-from PIL import Image
+import argparse
+import subprocess
+
+# Only the standard library at import time: numpy, PIL, the processors (and transformers,
+# via the hub backends) are imported by the subcommands that need them
 
 DOC_DIR = "stress_test_documents"
 PATCH_SIZE = 14
@@ -21,221 +23,260 @@ DOCS = [
     {"id": "10_postage_stamp",       "width": 64,   "height": 64,   "desc": "Postage stamp (tiny)"},
 ]
 
-def calc_expected(w, h, p=14):
-    return (w // p) * (h // p)
+MODELS = ("glm", "qwen")
+HEAVY_PACKAGES = ("transformers", "torch", "PIL", "numpy", "pandas")
+RESULTS_FILE = "document_navit_results.json"
+# Runs on the reference stand-ins go here, so they never overwrite the tracked hub-model results
+OFFLINE_RESULTS_FILE = "document_navit_results_offline.json"
 
 
-def test_glm():
-    print("\n" + "="*70)
-    print("GLM-OCR — Document NaViT Test")
-    print("="*70 + "\n")
-    
-    from transformers import AutoImageProcessor
+def results_path(offline=False, log=False):
+    """The summary JSON (or, with log=True, its JSONL log) for hub or offline runs"""
+    path = os.path.join(DOC_DIR, OFFLINE_RESULTS_FILE if offline else RESULTS_FILE)
+    return path + "l" if log else path
+
+
+def calc_expected(w, h, model="qwen"):
+    """Patch count the model's smart_resize should produce for a w x h image"""
+    from navit_grid import predict_grid_thw, grid_patches
+    return int(grid_patches(predict_grid_thw([w], [h], model))[0])
+
+
+def expected_for_docs(model):
+    """Predicted patch counts for every DOCS entry, in one vectorized call"""
+    from navit_driver import expected_patches
+    return expected_patches(DOCS, model)
+
+
+def test_glm(batch_size=0, backend="glm"):
+    from navit_driver import GLMAdapter, run_model
+    return run_model(GLMAdapter(backend), DOCS, DOC_DIR, batch_size)
+
+
+def test_qwen(batch_size=0, backend="qwen"):
+    from navit_driver import QwenAdapter, run_model
+    return run_model(QwenAdapter(backend), DOCS, DOC_DIR, batch_size)
+
+
+def cmd_plan(args):
+    """Expected grids for every document, from navit_grid alone: no images, no processors"""
+    from navit_grid import predict_grid_thw, grid_patches, PROFILES
+    models = MODELS if args.model == "both" else (args.model,)
+    w = [d["width"] for d in DOCS]
+    h = [d["height"] for d in DOCS]
+    grids = {m: predict_grid_thw(w, h, m, strict=False) for m in models}
+    print(f"{'Document':<28} {'Dims':<12}" + "".join(f"{m + ' grid':>14} {m + ' tokens':>12}" for m in models))
+    print("-"*(40 + 27 * len(models)))
+    for i, d in enumerate(DOCS):
+        cells = []
+        for m in models:
+            t, gh, gw = grids[m][i]
+            merge = PROFILES[m]["merge_size"]
+            cells.append(f"{f'{gh}x{gw}':>14} {gh * gw // (merge * merge):>12,}")
+        print(f"  {d['id']:<26} {d['width']}x{d['height']:<7}" + "".join(cells))
+    print("-"*(40 + 27 * len(models)))
+    print(f"{'Patches':<40}" + "".join(f"{int(grid_patches(grids[m]).sum()):>14,} {'':>12}" for m in models))
+
+
+def cmd_verify(args):
+    from navit_driver import ADAPTERS, make_adapter, print_report, run_models
+    from results_sink import ResultsSink
     
-    print("Loading GLM-OCR image processor...")
-    ip = AutoImageProcessor.from_pretrained("zai-org/GLM-OCR", trust_remote_code=True)
-    print(f"✓ Loaded: {type(ip).__name__}")
+    print("="*70)
+    print("NaViT DOCUMENT STRESS TEST — REALISTIC DOCUMENTS")
+    print("="*70)
     
-    has_dynamic = False
-    print("\nProcessor attributes:")
-    for attr in ['size', 'image_size', 'min_pixels', 'max_pixels', 'crop_size', 'do_resize']:
-        val = getattr(ip, attr, 'N/A')
-        print(f"  {attr}: {val}")
-        if attr == 'min_pixels' and val != 'N/A':
-            has_dynamic = True
+    docs, doc_dir = DOCS, DOC_DIR
+    if args.packed:
+        from packed_corpus import PackedCorpus
+        docs, doc_dir = PackedCorpus(args.packed).docs(), args.packed
+        print(f"Packed corpus: {args.packed} ({len(docs):,} pages, memory-mapped)")
     
-    results = []
-    print(f"\n{'Document':<28} {'Dims':<14} {'Expected':>8} {'Actual':>8} {'Grid':>12} {'Padding':>14} {'Status'}")
-    print("-"*90)
+    names = list(ADAPTERS) if args.model == "both" else [args.model]
+    backends = [f"reference-{n}" if args.offline else None for n in names]
+    if args.daemon:
+        from processor_daemon import DaemonAdapter
+        adapters = [DaemonAdapter(n, b, args.daemon) for n, b in zip(names, backends)]
+        print(f"Processors served by the daemon on {args.daemon}")
+    else:
+        adapters = [make_adapter(n, b) for n, b in zip(names, backends)]
+    if args.cache:
+        from preprocess_cache import shared_cache
+        for adapter in adapters:
+            adapter.cache = shared_cache(args.cache, args.cache_mb)
+    if args.template_cache:
+        if args.cache:
+            print("  ⚠️ --template-cache only runs on --cache misses: hits skip the processor entirely")
+        from chat_template_cache import ChatTemplateCache
+        for adapter in adapters:
+            if hasattr(adapter, "templates"):
+                adapter.templates = ChatTemplateCache()
+    out = results_path(args.offline)
+    sink = ResultsSink(results_path(args.offline, log=True), resume=args.resume)
     
-    for cfg in DOCS:
-        path = os.path.join(DOC_DIR, f"{cfg['id']}.png")
-        img = Image.open(path)
-        expected = calc_expected(cfg["width"], cfg["height"])
-        
-        result = {
-            "id": cfg["id"], "desc": cfg["desc"],
-            "dimensions": f"{cfg['width']}x{cfg['height']}",
-            "expected_tokens": expected,
-            "actual_tokens": None,
-            "preprocessed_size": None,
-            "status": "pending"
-        }
-        
-        try:
-            inputs = ip(images=img, return_tensors="pt")
-            if 'image_grid_thw' in inputs:
-                grid = inputs['image_grid_thw']
-                t, h_p, w_p = grid[0].tolist()
-                result["actual_tokens"] = int(h_p * w_p)
-                result["grid"] = f"{int(h_p)}x{int(w_p)}"
-                
-                eff_h = int(h_p) * PATCH_SIZE
-                eff_w = int(w_p) * PATCH_SIZE
-                pad_h = eff_h - cfg["height"]
-                pad_w = eff_w - cfg["width"]
-                result["padding"] = f"+{pad_w}w,+{pad_h}h"
-                result["preprocessed_size"] = f"{int(w_p)}x{int(h_p)} grid"
-            else:
-                for key in inputs:
-                    tensor = inputs[key]
-                    if hasattr(tensor, 'shape'):
-                        if len(tensor.shape) == 4:
-                            _, c, h, w = tensor.shape
-                            result["actual_tokens"] = (w // PATCH_SIZE) * (h // PATCH_SIZE)
-                            result["preprocessed_size"] = f"{w}x{h}"
-            
-            if result["actual_tokens"] is not None:
-                act = result["actual_tokens"]
-                if act in [256, 576, 1024] and expected not in [256, 576, 1024]:
-                    result["status"] = "FAIL"
-                elif abs(act - expected) / max(expected, 1) < 0.5:
-                    result["status"] = "PASS"
-                elif expected < 100 and act not in [256, 576, 1024]:
-                    # Tiny images: large relative deviation but valid NaViT upscaling
-                    result["status"] = "PASS"
-                else:
-                    result["status"] = "CHECK"
-            else:
-                result["status"] = "N/A"
-                result["keys"] = list(inputs.keys())
-        except Exception as e:
-            result["status"] = "ERROR"
-            result["error"] = str(e)[:80]
-        
-        results.append(result)
-        icon = {"PASS":"✅","FAIL":"❌","CHECK":"⚠️","ERROR":"💥","N/A":"❓"}[result["status"]]
-        act_str = str(result.get("actual_tokens") or "N/A")
-        grid_str = result.get("grid") or "-"
-        pad_str = result.get("padding") or "-"
-        print(f"  {cfg['id']:<26} {cfg['width']}x{cfg['height']:<8} {expected:>8,} {act_str:>8} {grid_str:>12} {pad_str:>14} {icon}")
-        
-        del img
-        gc.collect()
+    def on_done(model, rows):
+        # Batched fields arrive after the per-image pass: re-log the rows that gained them
+        for r in rows:
+            if "batched_grid" in r or "batched_error" in r:
+                sink.write(model, r)
     
-    passes = sum(1 for r in results if r["status"] == "PASS")
-    print(f"\nGLM-OCR: {passes}/10 PASS")
+    errors = {}
+    callbacks = dict(on_result=sink.write, on_done=on_done, skip=sink.done)
+    if args.mem_budget:
+        from navit_scheduler import run_scheduled
+        _, errors = run_scheduled(adapters, docs, doc_dir, args.mem_budget, args.batch_size,
+                                  args.remeasure, **callbacks)
+    elif args.isolate:
+        from navit_worker import run_isolated
+        _, errors = run_isolated([[a] for a in adapters], docs, doc_dir, args.batch_size, **callbacks)
+    else:
+        run_models(adapters, docs, doc_dir, args.batch_size, concurrent=args.concurrent, **callbacks)
     
-    del ip
-    gc.collect()
+    # The JSONL log is the source of truth; it also holds documents from resumed runs
+    results = sink.write_summary(out, names, docs, errors, backends={a.name: a.backend for a in adapters})
+    sink.close()
+    print_report(results, docs)
+    for model, err in errors.items():
+        print(f"  💥 {model}: {err}")
     
-    return results
+    print(f"\n Results: {out} (log: {sink.path})")
+    print("="*70)
 
 
-def test_qwen():
+def cmd_bench(args):
+    from navit_benchmark import run_benchmark
+    run_benchmark(args.processors.split(","), args.warmup, args.trials)
+
+
+def cmd_report(args):
+    """Re-print the summary of the last run from its results file, without running anything"""
+    import json
+    from navit_driver import print_report
+    path = args.results or results_path(args.offline)
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    results = data["results"]
+    ids = {r["id"] for rows in results.values() for r in rows}
+    docs = [d for d in DOCS if d["id"] in ids] + [{"id": i} for i in sorted(ids - {d["id"] for d in DOCS})]
+    print(f"Results from {path} ({data.get('timestamp', 'no timestamp')})")
+    for model, backend in data.get("backends", {}).items():
+        print(f"  {model}: {backend}")
+    print_report(results, docs)
+    for model, err in data.get("errors", {}).items():
+        print(f"  💥 {model}: {err}")
+
+
+def import_time_report(argv, top=15):
+    """Run this CLI again under -X importtime and summarize where startup time goes"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", os.path.abspath(__file__), *argv],
+                          capture_output=True, text=True, encoding="utf-8",
+                          env={**os.environ, "NAVIT_IMPORT_TIME": "1"})
+    sys.stdout.write(proc.stdout)
+    rows, loaded = [], []
+    for line in proc.stderr.splitlines():
+        m = re.match(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)", line)
+        if line.startswith("loaded packages:"):
+            loaded = line.split(":", 1)[1].split()
+        elif m:
+            rows.append((int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2, m.group(4)))
+        elif not line.startswith("import time:"):
+            sys.stderr.write(line + "\n")
+    total_us = sum(cum for _, cum, depth, _ in rows if depth == 0)
     print("\n" + "="*70)
-    print("Qwen2.5-VL-3B — Document NaViT Test")
-    print("="*70 + "\n")
-    
-    from transformers import AutoProcessor
-    
-    print("Loading Qwen2.5-VL processor...")
-    processor = AutoProcessor.from_pretrained("Qwen/Qwen2.5-VL-3B-Instruct", trust_remote_code=True)
-    print(f"✓ Loaded: {type(processor).__name__}\n")
-    
-    results = []
-    print(f"{'Document':<28} {'Dims':<14} {'Expected':>8} {'Actual':>8} {'Grid':>12} {'Padding':>14} {'Status'}")
-    print("-"*90)
-    
-    for cfg in DOCS:
-        path = os.path.join(DOC_DIR, f"{cfg['id']}.png")
-        img = Image.open(path)
-        expected = calc_expected(cfg["width"], cfg["height"])
-        
-        result = {
-            "id": cfg["id"], "desc": cfg["desc"],
-            "dimensions": f"{cfg['width']}x{cfg['height']}",
-            "expected_tokens": expected,
-            "actual_tokens": None,
-            "grid": None,
-            "padding": None,
-            "status": "pending"
-        }
-        
-        try:
-            messages = [{"role": "user", "content": [
-                {"type": "image", "image": img},
-                {"type": "text", "text": "OCR this document"}
-            ]}]
-            text = processor.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-            inputs = processor(text=[text], images=[img], return_tensors="pt", padding=True)
-            
-            if 'image_grid_thw' in inputs:
-                grid = inputs['image_grid_thw']
-                t, h_p, w_p = grid[0].tolist()
-                result["actual_tokens"] = int(h_p * w_p)
-                result["grid"] = f"{int(h_p)}x{int(w_p)}"
-                
-                eff_h = int(h_p) * PATCH_SIZE
-                eff_w = int(w_p) * PATCH_SIZE
-                pad_h = eff_h - cfg["height"]
-                pad_w = eff_w - cfg["width"]
-                result["padding"] = f"+{pad_w}w,+{pad_h}h"
-            
-            if result["actual_tokens"] is not None:
-                act = result["actual_tokens"]
-                if act in [256, 576, 1024] and expected not in [256, 576, 1024]:
-                    result["status"] = "FAIL"
-                elif abs(act - expected) / max(expected, 1) < 0.5:
-                    result["status"] = "PASS"
-                elif expected < 100 and act not in [256, 576, 1024]:
-                    # Tiny images: large relative deviation but valid NaViT upscaling
-                    result["status"] = "PASS"
-                else:
-                    result["status"] = "CHECK"
-            else:
-                result["status"] = "N/A"
-        except Exception as e:
-            result["status"] = "ERROR"
-            result["error"] = str(e)[:80]
-        
-        results.append(result)
-        icon = {"PASS":"✅","FAIL":"❌","CHECK":"⚠️","ERROR":"💥","N/A":"❓"}[result["status"]]
-        act_str = str(result.get("actual_tokens") or "N/A")
-        grid_str = result.get("grid") or "-"
-        pad_str = result.get("padding") or "-"
-        print(f"  {cfg['id']:<26} {cfg['width']}x{cfg['height']:<8} {expected:>8,} {act_str:>8} {grid_str:>12} {pad_str:>14} {icon}")
-        
-        del img
-        gc.collect()
-    
-    passes = sum(1 for r in results if r["status"] == "PASS")
-    print(f"\nQwen2.5-VL: {passes}/10 PASS")
-    
-    del processor
-    gc.collect()
-    
-    return results
+    print(f"IMPORT TIME — {' '.join(argv) or '(no arguments)'}: {total_us / 1000:.1f}ms, {len(rows)} modules")
+    print("="*70)
+    print(f"{'Module':<44} {'Self':>10} {'Cumulative':>12}")
+    print("-"*70)
+    for self_us, cum_us, depth, name in sorted(rows, key=lambda r: -r[1])[:top]:
+        print(f"  {'  ' * min(depth, 4) + name:<42} {self_us / 1000:>8.1f}ms {cum_us / 1000:>10.1f}ms")
+    print("-"*70)
+    # -X importtime also logs imports that failed (optional torch), so the child reports sys.modules itself
+    print(f"Heavy packages loaded: {', '.join(loaded) or 'none'}")
+    return proc.returncode
 
 
-def main():
-    mode = sys.argv[1] if len(sys.argv) > 1 else "both"
+def build_parser():
+    parser = argparse.ArgumentParser(description="NaViT document stress test")
+    parser.add_argument("--import-time", action="store_true",
+                        help="run the command under -X importtime and print an import-time summary")
+    sub = parser.add_subparsers(dest="command")
     
-    print("="*70)
-    print("NaViT DOCUMENT STRESS TEST — REALISTIC DOCUMENTS")
-    print("="*70)
+    plan = sub.add_parser("plan", help="expected grids from DOCS metadata only (no images, no processors)")
+    plan.add_argument("model", nargs="?", default="both", choices=[*MODELS, "both"])
+    plan.set_defaults(func=cmd_plan)
     
-    results = {}
+    verify = sub.add_parser("verify", help="run the processors over the documents and check every grid")
+    verify.add_argument("model", nargs="?", default="both", choices=[*MODELS, "both"])
+    verify.add_argument("--batch-size", type=int, default=0,
+                        help="also preprocess DOCS N images per processor call (0 = per-image only)")
+    verify.add_argument("--offline", action="store_true",
+                        help="use the local reference-glm/reference-qwen backends instead of the hub models "
+                             f"(results go to {OFFLINE_RESULTS_FILE})")
+    verify.add_argument("--concurrent", action="store_true",
+                        help="run the models in parallel threads in this process")
+    verify.add_argument("--isolate", action="store_true",
+                        help="run each model in its own worker subprocess, streaming results back")
+    verify.add_argument("--mem-budget", type=int, metavar="MB",
+                        help="measure processor footprints and run models co-resident only if they fit, "
+                             "otherwise one after another in isolated subprocesses")
+    verify.add_argument("--remeasure", action="store_true",
+                        help="ignore cached processor footprints for --mem-budget")
+    verify.add_argument("--resume", action="store_true",
+                        help="keep the results .jsonl log and skip documents it already records (ERROR rows are retried)")
+    verify.add_argument("--packed", metavar="PATH",
+                        help="read pages from a packed corpus file (generate_documents.py --format packed) "
+                             "through a memory map instead of decoding PNGs")
+    verify.add_argument("--cache", nargs="?", const=os.path.join(DOC_DIR, "preprocess_cache"), metavar="DIR",
+                        help="reuse pixel_values/image_grid_thw from an on-disk cache keyed by image content "
+                             "and processor config (default dir: stress_test_documents/preprocess_cache)")
+    verify.add_argument("--cache-mb", type=float, default=2048,
+                        help="cache size cap; least recently used entries are evicted past it")
+    verify.add_argument("--template-cache", action="store_true",
+                        help="qwen: render the chat template once per prompt and splice the image pads "
+                             "from each grid instead of templating and tokenizing every document")
+    verify.add_argument("--daemon", nargs="?", const="default", metavar="SOCKET",
+                        help="send images to a running processor_daemon.py instead of loading the processors "
+                             "here (default socket when no path is given)")
+    verify.set_defaults(func=cmd_verify)
     
-    if mode in ["glm", "both"]:
-        results["glm"] = test_glm()
-        gc.collect()
+    bench = sub.add_parser("bench", help="preprocessing throughput and latency per processor")
+    bench.add_argument("--processors", default="glm,qwen",
+                       help="comma-separated processor backends (glm, qwen, reference-glm, reference-qwen)")
+    bench.add_argument("--warmup", type=int, default=2, help="untimed calls per document")
+    bench.add_argument("--trials", type=int, default=10, help="timed calls per document")
+    bench.set_defaults(func=cmd_bench)
     
-    if mode in ["qwen", "both"]:
-        results["qwen"] = test_qwen()
-        gc.collect()
-
-    out = os.path.join(DOC_DIR, "document_navit_results.json")
-    with open(out, "w", encoding="utf-8") as f:
-        json.dump({
-            "timestamp": datetime.now().isoformat(),
-            "test_type": "realistic_documents",
-            "results": results
-        }, f, indent=2, ensure_ascii=False, default=str)
+    report = sub.add_parser("report", help="print the summary table of the last verify run")
+    report.add_argument("--results", metavar="JSON", help=f"results file (default: {DOC_DIR}/{RESULTS_FILE})")
+    report.add_argument("--offline", action="store_true", help=f"report the last --offline run ({OFFLINE_RESULTS_FILE})")
+    report.set_defaults(func=cmd_report)
+    return parser
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if "--import-time" in argv:
+        argv.remove("--import-time")
+        return import_time_report(argv)
+    if os.environ.get("NAVIT_IMPORT_TIME"):
+        import atexit
+        atexit.register(lambda: sys.stderr.write(
+            "loaded packages: " + " ".join(p for p in HEAVY_PACKAGES if p in sys.modules) + "\n"))
     
-    print(f"\n Results: {out}")
-    print("="*70)
+    # Old style: `test_doc_navit.py [glm|qwen|both] [flags]` still means verify
+    if not argv or argv[0] in (*MODELS, "both") or (argv[0].startswith("-") and argv[0] not in ("-h", "--help")):
+        argv = ["verify", *argv]
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, "daemon", None):
+        if args.isolate or args.mem_budget or args.cache or args.template_cache:
+            parser.error("--daemon runs the processors in the daemon: drop --isolate/--mem-budget/--cache/"
+                         "--template-cache (start the daemon with --cache-dir instead)")
+        if args.daemon == "default":
+            from processor_daemon import DEFAULT_SOCKET
+            args.daemon = DEFAULT_SOCKET
+    return args.func(args)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def daemon_cli(*args, timeout=30):
+    return subprocess.run([sys.executable, os.path.join(HERE, "processor_daemon.py"), *args],
+                          capture_output=True, text=True, timeout=timeout)
+
+
+def stop_once(socket_path, start_timeout=30):
+    """Serve (no models preloaded), ask for status, stop. Returns None on success or what went wrong."""
+    server = subprocess.Popen([sys.executable, os.path.join(HERE, "processor_daemon.py"), "serve",
+                               "--socket", socket_path, "--models", ""],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    try:
+        deadline = time.monotonic() + start_timeout
+        while not os.path.exists(socket_path):
+            if server.poll() is not None or time.monotonic() > deadline:
+                return f"daemon never came up: {server.stderr.read().strip()[-200:]}"
+            time.sleep(0.02)
+        status = daemon_cli("status", "--socket", socket_path)
+        if status.returncode:
+            return f"status failed: {status.stderr.strip()[-200:]}"
+        stop = daemon_cli("stop", "--socket", socket_path)
+        if stop.returncode:
+            return f"stop failed: {stop.stderr.strip()[-200:]}"
+        server.wait(timeout=10)
+        if os.path.exists(socket_path):
+            return "socket left behind"
+        return None
+    finally:
+        if server.poll() is None:
+            server.kill()
+            server.wait()
+        server.stderr.close()
+
+
+def test_stop_repeatedly(runs=12):
+    """`processor_daemon.py stop` must get its reply every time, not race the daemon's exit"""
+    with tempfile.TemporaryDirectory() as tmp:
+        failures = [(n, err) for n in range(runs)
+                    if (err := stop_once(os.path.join(tmp, f"daemon-{n}.sock")))]
+    assert not failures, failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Start and stop the processor daemon over and over")
+    parser.add_argument("--runs", type=int, default=12)
+    args = parser.parse_args(argv)
+
+    print("="*70)
+    print(f"PROCESSOR DAEMON — serve/status/stop x {args.runs}")
+    print("="*70)
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in range(args.runs):
+            err = stop_once(os.path.join(tmp, f"daemon-{n}.sock"))
+            failures += err is not None
+            print(f"  {n + 1:>3}  {'✅' if err is None else '❌ ' + err}")
+    print(f"\n{'✅' if not failures else '❌'} {args.runs - failures}/{args.runs} clean stops")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
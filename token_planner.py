@@ -0,0 +1,163 @@
+import os
+import sys
+import json
+import argparse
+import numpy as np
+
+from navit_grid import PROFILES, get_profile, predict_grid_thw, grid_patches
+
+HIST_EDGES = [0, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384]
+
+
+def load_dimensions(path, width_col="width", height_col="height"):
+    """Read page widths/heights from a CSV or Parquet file as int64 arrays"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".parquet", ".pq"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("reading Parquet needs pyarrow: pip install pyarrow")
+        table = pq.read_table(path, columns=[width_col, height_col])
+        return (table.column(width_col).to_numpy().astype(np.int64),
+                table.column(height_col).to_numpy().astype(np.int64))
+
+    try:
+        import pandas as pd
+    except ImportError:
+        pd = None
+    if pd is not None:
+        df = pd.read_csv(path, usecols=[width_col, height_col])
+        return df[width_col].to_numpy(np.int64), df[height_col].to_numpy(np.int64)
+
+    data = np.genfromtxt(path, delimiter=",", names=True, usecols=(width_col, height_col), dtype=np.int64)
+    return data[width_col].reshape(-1), data[height_col].reshape(-1)
+
+
+def plan(widths, heights, model="qwen", pad_to=None, hist_edges=None, **overrides):
+    """Predict token counts and padding waste for arrays of page sizes.
+
+    tokens are what the LLM sees (patches / merge_size**2). Sequences padded to a
+    common length (pad_to, default the longest sequence) waste pad_to - tokens each;
+    pages longer than pad_to are counted as overflow instead.
+    """
+    cfg = get_profile(model, **overrides)
+    w = np.asarray(widths, dtype=np.int64).reshape(-1)
+    h = np.asarray(heights, dtype=np.int64).reshape(-1)
+
+    grid = predict_grid_thw(w, h, cfg, strict=False)
+    patches = grid_patches(grid)
+    merge = cfg["merge_size"]
+    tokens = patches // (merge * merge)
+    valid = grid[:, 0] > 0
+
+    p = cfg["patch_size"]
+    pad_w = np.where(valid, grid[:, 2] * p - w, 0)
+    pad_h = np.where(valid, grid[:, 1] * p - h, 0)
+
+    vt = tokens[valid]
+    if pad_to is None:
+        pad_to = int(vt.max()) if vt.size else 0
+    fits = vt <= pad_to
+    slots = int(fits.sum()) * pad_to
+    used = int(vt[fits].sum())
+
+    edges = np.asarray(hist_edges if hist_edges is not None else HIST_EDGES, dtype=np.int64)
+    if vt.size and edges[-1] <= vt.max():
+        edges = np.append(edges, vt.max() + 1)
+    counts, edges = np.histogram(vt, bins=edges)
+
+    return {
+        "model": model if isinstance(model, str) else "custom",
+        "pages": int(w.size),
+        "invalid_pages": int((~valid).sum()),
+        "grid": grid,
+        "patches": patches,
+        "tokens": tokens,
+        "pad_w": pad_w,
+        "pad_h": pad_h,
+        "total_tokens": int(vt.sum()),
+        "token_percentiles": {f"p{q}": float(v) for q, v in
+                              zip((50, 90, 99), np.percentile(vt, (50, 90, 99)) if vt.size else (0, 0, 0))},
+        "pad_to": pad_to,
+        "padding_tokens": slots - used,
+        "padding_fraction": (slots - used) / slots if slots else 0.0,
+        "overflow_pages": int((~fits).sum()),
+        "histogram": {"edges": edges.tolist(), "counts": counts.tolist()},
+    }
+
+
+def summarize(result):
+    """JSON-safe view of a plan() result without the per-page arrays"""
+    return {k: v for k, v in result.items() if not isinstance(v, np.ndarray)}
+
+
+def print_plan(result):
+    print(f"\nModel: {result['model']}   Pages: {result['pages']:,}   Invalid (>200:1): {result['invalid_pages']:,}")
+    pct = result["token_percentiles"]
+    print(f"Visual tokens: {result['total_tokens']:,} total, p50 {pct['p50']:.0f}, p90 {pct['p90']:.0f}, p99 {pct['p99']:.0f}")
+    print(f"Padding to {result['pad_to']:,}: {result['padding_tokens']:,} tokens wasted "
+          f"({result['padding_fraction']:.1%}), {result['overflow_pages']:,} pages overflow")
+    print(f"\n{'Tokens':<20} {'Pages':>12}")
+    print("-"*34)
+    edges, counts = result["histogram"]["edges"], result["histogram"]["counts"]
+    for lo, hi, n in zip(edges[:-1], edges[1:], counts):
+        print(f"  {f'[{lo}, {hi})':<18} {n:>12,}")
+
+
+def check_results(path):
+    """Compare predicted grids with the ones recorded in a document_navit_results.json"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    mismatches = []
+    for model, rows in data["results"].items():
+        rows = [r for r in rows if r.get("grid")]
+        if model not in PROFILES or not rows:
+            continue
+        dims = np.array([[int(v) for v in r["dimensions"].split("x")] for r in rows], dtype=np.int64)
+        grid = predict_grid_thw(dims[:, 0], dims[:, 1], model, strict=False)
+        for r, (t, gh, gw) in zip(rows, grid):
+            if f"{gh}x{gw}" != r["grid"]:
+                mismatches.append({"model": model, "id": r["id"], "recorded": r["grid"], "predicted": f"{gh}x{gw}"})
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Predict NaViT visual token budgets from page dimensions")
+    parser.add_argument("path", nargs="?", help="CSV or Parquet file with page sizes (default: the DOCS table)")
+    parser.add_argument("--model", choices=sorted(PROFILES), default="qwen")
+    parser.add_argument("--width-col", default="width")
+    parser.add_argument("--height-col", default="height")
+    parser.add_argument("--pad-to", type=int, help="sequence length every page is padded to")
+    parser.add_argument("--min-pixels", type=int)
+    parser.add_argument("--max-pixels", type=int)
+    parser.add_argument("--json", help="write the summary as JSON to this path")
+    parser.add_argument("--check-results", metavar="JSON",
+                        help="verify predictions against a recorded document_navit_results.json")
+    args = parser.parse_args(argv)
+
+    if args.check_results:
+        mismatches = check_results(args.check_results)
+        for m in mismatches:
+            print(f"  ❌ {m['model']:<5} {m['id']:<26} recorded {m['recorded']:>9}  predicted {m['predicted']:>9}")
+        print(f"{'✅' if not mismatches else '❌'} {len(mismatches)} grid mismatch(es) in {args.check_results}")
+        return 1 if mismatches else 0
+
+    if args.path:
+        widths, heights = load_dimensions(args.path, args.width_col, args.height_col)
+    else:
+        from test_doc_navit import DOCS
+        widths = [d["width"] for d in DOCS]
+        heights = [d["height"] for d in DOCS]
+
+    result = plan(widths, heights, args.model, pad_to=args.pad_to,
+                  min_pixels=args.min_pixels, max_pixels=args.max_pixels)
+    print_plan(result)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summarize(result), f, indent=2)
+        print(f"\n Summary: {args.json}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())